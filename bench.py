@@ -0,0 +1,81 @@
+"""
+Benchmarks for the data path. run with: python bench.py [n_entries]
+"""
+import sys
+import timeit
+import tracemalloc
+import xmlrpc.client
+
+from msorm.columnar import ColumnStore
+from msorm.records import to_records
+from msorm.xmlparse import loads
+
+
+def fake_entries(n):
+    return [dict(id=i,
+                 name=f'Member {i}',
+                 member_id=[i, f'Member {i}'] if i % 5 else False,
+                 primary_membership_organization_id=[i % 40, f'Gruppe {i % 40}'],
+                 birthdate=f'200{i % 10}-0{i % 9 + 1}-1{i % 9}',
+                 gender='male' if i % 2 else 'female',
+                 active=True,
+                 age=i % 30 + 0.5,
+                 event_registration_ids=list(range(i % 7)),
+                 email=f'member{i}@example.com &lt;spejder&gt;')
+            for i in range(n)]
+
+
+def stock_loads(data):
+    parser, unmarshaller = xmlrpc.client.getparser()
+    parser.feed(data)
+    parser.close()
+    return unmarshaller.close()
+
+
+def bench_parser(n=10000, repeat=5):
+    data = xmlrpc.client.dumps((fake_entries(n),), methodresponse=True).encode('utf-8')
+    print(f'XML-RPC search_read response with {n} entries ({len(data) / 2 ** 20:.1f} MiB)')
+    timings = dict()
+    for name, parse in (('xmlrpc.client', stock_loads),
+                        ('xmlparse', loads),
+                        ('xmlparse rows', lambda d: loads(d, rows=True))):
+        timings[name] = min(timeit.repeat(lambda: parse(data), number=1, repeat=repeat))
+        print(f'{name:<20}{timings[name] * 1000:>10.1f} ms'
+              f'{timings["xmlrpc.client"] / timings[name]:>8.2f}x')
+
+
+def column_store(entries):
+    store = ColumnStore()
+    store.extend(entries)
+    return store
+
+
+def allocated(build):
+    """Bytes still allocated by the result of build()"""
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def bench_memory(n=10000, extra_fields=0):
+    entries = fake_entries(n)
+    for entry in entries:
+        entry.update((f'field_{i}', False) for i in range(extra_fields))
+    data = xmlrpc.client.dumps((entries,), methodresponse=True).encode('utf-8')
+    print(f'Memory of {n} entries with {len(entries[0])} fields')
+    sizes = dict()
+    for name, build in (('dicts', lambda: loads(data)[0]),
+                        ('records', lambda: to_records('member.member', loads(data)[0])),
+                        ('columns', lambda: column_store(loads(data)[0]))):
+        sizes[name] = allocated(build)
+        print(f'{name:<20}{sizes[name] / 2 ** 20:>10.1f} MiB'
+              f'{sizes["dicts"] / sizes[name]:>8.2f}x')
+
+
+if __name__ == '__main__':
+    bench_parser(*map(int, sys.argv[1:2]))
+    bench_memory(*map(int, sys.argv[1:2]))
+    bench_memory(*map(int, sys.argv[1:2]), extra_fields=200)
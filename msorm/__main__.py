@@ -3,9 +3,8 @@ from itertools import chain
 from typing import NamedTuple, List
 
 import json_tricks
-from aioxmlrpc.client import Fault
 
-from msorm.scripts import get_signup_data
+from msorm.scripts import get_signup_data, registration_counts
 from .login import Credentials, Requester
 from .models import Event, Filter, Member, Registration, Profile, ModelBase, ModelOverview, Membership, Answer, Question
 from pprint import pprint
@@ -167,26 +166,13 @@ event_codes = """12630
 main_event_code = '18600'
 
 
-async def try_request(requester: ModelBase, field, *args, **kwargs):
-    try:
-        await requester.get_entries(field, *args, **kwargs)
-    except Fault:
-        return None
-    return field
-
-
-async def find_permitted_fields(requester: ModelBase, fields, *args, **kwargs):
-    fields = await asyncio.gather(*(try_request(requester, field, *args, **kwargs) for field in fields))
-    return list(sorted(f for f in fields if f is not None))
-
-
 QUESTIONS_OF_INTEREST = [
     "Vælg kurser",
     "Er du Søspejder?",
 ]
 async def main(*_):
     creds = Credentials()
-    async with Requester(creds) as req:
+    async with Requester(creds, persistent_cache=True) as req:
         signups = await get_signup_data(
             main_event_code,
             requester=req,
@@ -194,9 +180,14 @@ async def main(*_):
             questions_of_interest={"Vælg kurser": list(),
                                    "Er du Søspejder?": "Nej"},
             limit=None,
+            incremental=True,
                               )
         with open("/tmp/signups.json", 'w') as fp:
             json_tricks.dump(signups, fp)
+        # registrations per state of every event, counted by the server without downloading them
+        counts = await registration_counts(req, [main_event_code, *event_codes])
+        with open("/tmp/registration_counts.json", 'w') as fp:
+            json_tricks.dump(counts, fp)
         return
 
 
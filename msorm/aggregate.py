@@ -0,0 +1,66 @@
+"""
+Client-side read_group.
+
+group_entries groups entries (as read from odoo) the way read_group does on the server, for when the
+server cannot or need not be asked: every group holds the values of the groupby fields (many2one as
+[id, name], False for empty), the number of entries in "__count", the sums of the numeric fields and the
+"__domain" that selects its entries. An x2many groupby field puts an entry in the group of each of its ids.
+With lazy, only the first groupby field is grouped by and "__context" holds the remaining ones, as in odoo.
+
+Groups are in order of their first entry. Date and datetime fields are grouped by period on the server
+("date:month") and are not supported here.
+"""
+from itertools import product
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
+
+from .columnar import index_keys
+from .normalize import columns_of
+
+NUMERIC = ('integer', 'float', 'monetary')
+
+
+def _label(value, key):
+    """The value odoo reports for the group of key"""
+    if key is None:
+        return False
+    if isinstance(value, (list, tuple)) and len(value) == 2 and isinstance(value[1], str):
+        return list(value)
+    return key
+
+
+def group_entries(entries: Sequence[Mapping[str, Any]],
+                  groupby: Sequence[str],
+                  fields: Sequence[str],
+                  types: Mapping[str, str],
+                  lazy: bool=True,
+                  domain: Sequence=()) -> List[Dict[str, Any]]:
+    """read_group over entries (dicts or Rows). types maps fields to odoo field types, as from fields_get"""
+    for field in groupby:
+        if ':' in field or types.get(field) in ('date', 'datetime'):
+            raise ValueError(f'Cannot group by {field} client-side')
+    remaining = list(groupby[1:]) if lazy else list()
+    groupby = list(groupby[:1]) if lazy else list(groupby)
+    aggregated = [f for f in dict.fromkeys(fields) if types.get(f) in NUMERIC and f not in groupby]
+
+    columns = columns_of(entries)
+    groups: Dict[Tuple, List[int]] = dict()
+    labels: Dict[Tuple, Tuple] = dict()
+    for row in range(len(entries)):
+        values = [columns[field][row] for field in groupby]
+        for key in product(*(index_keys(value) or (None,) for value in values)):
+            if key not in groups:
+                groups[key] = list()
+                labels[key] = tuple(_label(value, k) for value, k in zip(values, key))
+            groups[key].append(row)
+
+    result = list()
+    for key, rows in groups.items():
+        group = dict(zip(groupby, labels[key]))
+        group['__count'] = len(rows)
+        for field in aggregated:
+            group[field] = sum(columns[field][row] or 0 for row in rows)
+        group['__domain'] = [*domain, *([field, '=', False if k is None else k] for field, k in zip(groupby, key))]
+        if remaining:
+            group['__context'] = {'group_by': remaining}
+        result.append(group)
+    return result
@@ -0,0 +1,157 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import xmlrpc.client
+from contextlib import contextmanager
+from typing import Any, Hashable, List, NamedTuple, Optional, Tuple
+
+from .cache import DiskStore
+from .scheduler import Priority, Scheduler
+
+
+class _Call(NamedTuple):
+    service: str
+    method: str
+    params: Tuple
+    key: Hashable
+    priority: Priority
+    future: asyncio.Future
+
+
+def _rejects_multicall(fault: xmlrpc.client.Fault) -> bool:
+    """
+    Whether fault says the server has no system.multicall, as opposed to a fault of the call itself (e.g.
+    an expired session). Odoo answers "Method not available system.multicall", the stdlib server
+    'method "system.multicall" is not supported'
+    """
+    return 'system.multicall' in fault.faultString
+
+
+class BatchStats:
+    def __init__(self):
+        self.calls = 0
+        self.roundtrips = 0
+
+    def __repr__(self):
+        return f'<BatchStats calls={self.calls} roundtrips={self.roundtrips}>'
+
+
+class Batcher:
+    """
+    Coalesces calls issued within a short time window into single "system.multicall" round-trips.
+
+    Batching is active when a window is configured, or inside a batch() block where calls issued in
+    the same loop iteration (e.g. by one asyncio.gather) are coalesced. The batch() scope is held in a
+    context variable, so it covers the tasks started inside the block and no others. Results and faults
+    are handed back to the awaiting callers individually. Servers that reject system.multicall (stock
+    odoo does) are detected on the first batch, after which calls are dispatched individually over the
+    pool. With a DiskStore that verdict is kept per domain, so later runs skip the failing round-trip.
+    """
+    def __init__(self, transport, scheduler: Scheduler, window: Optional[float]=None, max_size: int=50,
+                 store: DiskStore=None, domain: str=None):
+        self.transport = transport
+        self.scheduler = scheduler
+        self.window = window
+        self.max_size = max_size
+        self.store = store
+        self.domain = domain
+        self.supported = transport.supports_multicall
+        if self.supported and store is not None and store.load_multicall(domain) is False:
+            self.supported = False
+        self.stats = BatchStats()
+        self._depth = contextvars.ContextVar(f'batch_depth_{id(self)}', default=0)
+        self._pending: List[_Call] = list()
+        self._timer: asyncio.Handle = None
+
+    @property
+    def active(self):
+        return self.window is not None or self._depth.get() > 0
+
+    @contextmanager
+    def batch(self):
+        token = self._depth.set(self._depth.get() + 1)
+        try:
+            yield self
+        finally:
+            self._depth.reset(token)
+
+    async def call(self, service, method, params: Tuple, key: Hashable=None,
+                   priority: Priority=Priority.NORMAL) -> Any:
+        """key is the scheduler queue used if the call ends up being dispatched on its own"""
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        self._pending.append(_Call(service, method, params, key or method, priority, future))
+        self.stats.calls += 1
+
+        if len(self._pending) >= self.max_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window or 0, self.flush)
+        return await future
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        calls, self._pending = self._pending, list()
+        by_service = dict()
+        for call in calls:
+            by_service.setdefault(call.service, list()).append(call)
+        for service, service_calls in by_service.items():
+            asyncio.ensure_future(self._dispatch(service, service_calls))
+
+    async def _single(self, call: _Call):
+        self.stats.roundtrips += 1
+        try:
+            result = await self.scheduler.run(call.key, call.priority,
+                                              functools.partial(self.transport.call, call.service,
+                                                                call.method, *call.params))
+        except Exception as exc:
+            if not call.future.done():
+                call.future.set_exception(exc)
+        else:
+            if not call.future.done():
+                call.future.set_result(result)
+
+    async def _dispatch(self, service, calls: List[_Call]):
+        calls = [call for call in calls if not call.future.done()]
+        if len(calls) <= 1 or not self.supported:
+            await asyncio.gather(*(self._single(call) for call in calls))
+            return
+
+        multicall = [dict(methodName=call.method, params=list(call.params)) for call in calls]
+        self.stats.roundtrips += 1
+        try:
+            results = await self.scheduler.run('system.multicall',
+                                               min(call.priority for call in calls),
+                                               functools.partial(self.transport.call, service,
+                                                                 'system.multicall', multicall))
+        except xmlrpc.client.Fault as exc:
+            if not _rejects_multicall(exc):
+                for call in calls:
+                    if not call.future.done():
+                        call.future.set_exception(exc)
+                return
+            logging.info(f'system.multicall not supported by the server ({exc.faultString.strip()}). '
+                         f'Dispatching calls individually')
+            self.supported = False
+            if self.store is not None:
+                self.store.save_multicall(self.domain, False)
+            self.stats.roundtrips -= 1
+            await asyncio.gather(*(self._single(call) for call in calls))
+            return
+        except Exception as exc:
+            for call in calls:
+                if not call.future.done():
+                    call.future.set_exception(exc)
+            return
+
+        for call, result in zip(calls, results):
+            if call.future.done():
+                continue
+            if isinstance(result, dict):
+                call.future.set_exception(xmlrpc.client.Fault(result['faultCode'], result['faultString']))
+            else:
+                call.future.set_result(result[0])
@@ -0,0 +1,396 @@
+import json
+import logging
+import sqlite3
+import sys
+import time
+from collections import OrderedDict, defaultdict
+from pathlib import Path
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple, Union
+
+VERSION_FIELDS = ('__last_update', 'write_date')
+
+
+def sizeof(value) -> int:
+    """Rough memory footprint of a field value as returned by odoo"""
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        size += sum(sys.getsizeof(v) for v in value)
+    return size
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __repr__(self):
+        return (f'<CacheStats hits={self.hits} misses={self.misses} evictions={self.evictions} '
+                f'expirations={self.expirations} invalidations={self.invalidations}>')
+
+
+class SyncState:
+    """write_date high-watermark and snapshot ids of one SyncEngine scope"""
+    def __init__(self, watermark: Optional[str]=None, reconciled_at: float=0., ids: Set[int]=None):
+        self.watermark = watermark
+        self.reconciled_at = reconciled_at
+        self.ids = ids or set()
+
+
+class Schema:
+    """fields_get result of one model and the ir.model write_date it was fetched at"""
+    def __init__(self, fields: Dict[str, Dict[str, Any]], write_date: Optional[str]=None, checked_at: float=0.):
+        self.fields = fields
+        self.write_date = write_date
+        self.checked_at = checked_at
+
+
+class FieldAccess:
+    """Fields of a model probed for read access by one user, at the ir.model write_date of the schema"""
+    def __init__(self, write_date: Optional[str]=None, tested: Set[str]=None, permitted: Set[str]=None):
+        self.write_date = write_date
+        self.tested = tested or set()
+        self.permitted = permitted or set()
+
+
+class DiskStore:
+    """
+    Persistent copy of the record cache. One SQLite file per odoo database.
+
+    Field values are stored json encoded together with the version (write_date/__last_update)
+    of the record they were fetched with.
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self._conn = sqlite3.connect(str(path))
+        self._conn.execute('CREATE TABLE IF NOT EXISTS records ('
+                           'model TEXT, id INTEGER, field TEXT, value TEXT, version TEXT, '
+                           'PRIMARY KEY (model, id, field))')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS sync_state ('
+                           'model TEXT, scope TEXT, watermark TEXT, reconciled_at REAL, ids TEXT, '
+                           'PRIMARY KEY (model, scope))')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS schemas ('
+                           'model TEXT PRIMARY KEY, fields TEXT, write_date TEXT, checked_at REAL)')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS field_access ('
+                           'model TEXT, uid INTEGER, write_date TEXT, tested TEXT, permitted TEXT, '
+                           'PRIMARY KEY (model, uid))')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS multicall (domain TEXT PRIMARY KEY, supported INTEGER)')
+        self._conn.commit()
+
+    def load(self, model: str) -> Dict[int, Tuple[Dict[str, Any], Any]]:
+        """All stored entries of model as id -> (entry, version)"""
+        records = dict()
+        cursor = self._conn.execute('SELECT id, field, value, version FROM records WHERE model = ?', (model,))
+        for id, field, value, version in cursor:
+            entry, _ = records.setdefault(id, (dict(id=id), version))
+            entry[field] = json.loads(value)
+        return records
+
+    def save(self, model: str, entries: Iterable[Tuple[Dict[str, Any], Any]]):
+        rows = ((model, entry['id'], field, json.dumps(value), version)
+                for entry, version in entries
+                for field, value in entry.items() if field != 'id')
+        with self._conn:
+            self._conn.executemany('INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?)', rows)
+
+    def delete(self, model: str, ids: Iterable[int]=None):
+        with self._conn:
+            if ids is None:
+                self._conn.execute('DELETE FROM records WHERE model = ?', (model,))
+            else:
+                self._conn.executemany('DELETE FROM records WHERE model = ? AND id = ?',
+                                       ((model, id) for id in ids))
+
+    def load_sync_state(self, model: str, scope: str):
+        row = self._conn.execute('SELECT watermark, reconciled_at, ids FROM sync_state '
+                                 'WHERE model = ? AND scope = ?', (model, scope)).fetchone()
+        if row is None:
+            return None
+        watermark, reconciled_at, ids = row
+        return SyncState(watermark, reconciled_at, set(json.loads(ids)))
+
+    def save_sync_state(self, model: str, scope: str, state):
+        with self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?, ?)',
+                               (model, scope, state.watermark, state.reconciled_at, json.dumps(sorted(state.ids))))
+
+    def load_schema(self, model: str) -> Optional[Schema]:
+        row = self._conn.execute('SELECT fields, write_date, checked_at FROM schemas WHERE model = ?',
+                                 (model,)).fetchone()
+        if row is None:
+            return None
+        fields, write_date, checked_at = row
+        return Schema(json.loads(fields), write_date, checked_at)
+
+    def save_schema(self, model: str, schema: Schema):
+        with self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO schemas VALUES (?, ?, ?, ?)',
+                               (model, json.dumps(schema.fields), schema.write_date, schema.checked_at))
+
+    def delete_schema(self, model: str=None):
+        with self._conn:
+            if model is None:
+                self._conn.execute('DELETE FROM schemas')
+                self._conn.execute('DELETE FROM field_access')
+            else:
+                self._conn.execute('DELETE FROM schemas WHERE model = ?', (model,))
+                self._conn.execute('DELETE FROM field_access WHERE model = ?', (model,))
+
+    def load_field_access(self, model: str, uid) -> Optional[FieldAccess]:
+        row = self._conn.execute('SELECT write_date, tested, permitted FROM field_access '
+                                 'WHERE model = ? AND uid = ?', (model, uid)).fetchone()
+        if row is None:
+            return None
+        write_date, tested, permitted = row
+        return FieldAccess(write_date, set(json.loads(tested)), set(json.loads(permitted)))
+
+    def save_field_access(self, model: str, uid, access: FieldAccess):
+        with self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO field_access VALUES (?, ?, ?, ?, ?)',
+                               (model, uid, access.write_date,
+                                json.dumps(sorted(access.tested)), json.dumps(sorted(access.permitted))))
+
+    def load_multicall(self, domain: str) -> Optional[bool]:
+        """Whether the server at domain was found to support system.multicall, None if never tried"""
+        row = self._conn.execute('SELECT supported FROM multicall WHERE domain = ?', (domain,)).fetchone()
+        return None if row is None else bool(row[0])
+
+    def save_multicall(self, domain: str, supported: bool):
+        with self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO multicall VALUES (?, ?)', (domain, int(supported)))
+
+    def clear(self):
+        """Drop the cached records and sync states. Schemas are kept"""
+        with self._conn:
+            self._conn.execute('DELETE FROM records')
+            self._conn.execute('DELETE FROM sync_state')
+
+    def close(self):
+        self._conn.close()
+
+
+class RecordCache:
+    """
+    Field values fetched during a session, shared by every model through the Requester.
+
+    Values are stored at (model, id, field) granularity, so a request for a subset of already fetched
+    fields is served without touching the network. The least recently used values are evicted once
+    the estimated memory use exceeds max_bytes, and values older than ttl seconds are treated as missing.
+    Whenever an entry arrives with a newer write_date/__last_update than the cached one, all cached
+    fields of that record are dropped.
+
+    With a DiskStore every entry put in the cache is also written to disk, and a model is loaded from disk
+    the first time it is used. Entries loaded from disk are "unverified" until their version has been
+    checked against the server with validate().
+
+    Besides values the cache keeps scopes: the complete result (ids) of a search, by domain key. A scope
+    lasts ttl seconds. It is dropped as soon as a record of its model changes, since the record may now
+    match, and when a record it holds is invalidated. Scopes let domains implying them be evaluated locally, see evaluate.py.
+    """
+    entry_overhead = 120  # bytes for the key tuple and bookkeeping of one cached value
+
+    def __init__(self, max_bytes: int=64 * 2 ** 20, ttl: Optional[float]=15 * 60, store: DiskStore=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.store = store
+        self.stats = CacheStats()
+        self.nbytes = 0
+        # (model, id, field) -> (value, stored_at, size)
+        self._values: 'OrderedDict[Tuple[str, int, str], Tuple[Any, float, int]]' = OrderedDict()
+        self._fields: Dict[Tuple[str, int], set] = defaultdict(set)
+        self._versions: Dict[Tuple[str, int], Any] = dict()
+        self._unverified = set()
+        self._loaded = set()
+        # model -> domain key -> (ids, stored_at)
+        self._scopes: Dict[str, Dict[Hashable, Tuple[List[int], float]]] = defaultdict(dict)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __repr__(self):
+        return f'<RecordCache records={len(self)} values={len(self._values)} bytes={self.nbytes}>'
+
+    def _lookup(self, key):
+        try:
+            value, stored_at, _ = self._values[key]
+        except KeyError:
+            raise KeyError(key) from None
+
+        if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+            self._discard(key)
+            self.stats.expirations += 1
+            raise KeyError(key)
+
+        self._values.move_to_end(key)
+        return value
+
+    def _discard(self, key):
+        _, _, size = self._values.pop(key)
+        self.nbytes -= size
+        model, id, field = key
+        fields = self._fields[model, id]
+        fields.discard(field)
+        if not fields:
+            del self._fields[model, id]
+            self._versions.pop((model, id), None)
+            self._unverified.discard((model, id))
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and self._values:
+            self._discard(next(iter(self._values)))
+            self.stats.evictions += 1
+
+    def _ensure_loaded(self, model: str):
+        if self.store is None or model in self._loaded:
+            return
+        self._loaded.add(model)
+
+        records = self.store.load(model)
+        self._put(model, ((entry, version) for entry, version in records.values()))
+        self._unverified.update((model, id) for id in records)
+        logging.debug(f'Loaded {len(records)} {model} entries from {self.store.path}')
+
+    def get(self, model: str, id: int, fields: Iterable[str]) -> Optional[Dict[str, Any]]:
+        """The entry with the requested fields, or None unless every field is cached"""
+        self._ensure_loaded(model)
+        entry = dict(id=id)
+        try:
+            for field in fields:
+                if field != 'id':
+                    entry[field] = self._lookup((model, id, field))
+        except KeyError:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return entry
+
+    def put(self, model: str, entries: Iterable[Dict[str, Any]]):
+        self._ensure_loaded(model)
+        entries = [(entry, next((entry[f] for f in VERSION_FIELDS if f in entry), None))
+                   for entry in entries]
+        for entry, version in entries:
+            if version is not None:
+                self.validate(model, {entry['id']: version})
+        self._put(model, entries)
+
+        if self.store is not None:
+            self.store.save(model, ((entry, self._versions.get((model, entry['id'])))
+                                    for entry, _ in entries))
+
+    def _put(self, model: str, entries: Iterable[Tuple[Dict[str, Any], Any]]):
+        now = time.monotonic()
+        for entry, version in entries:
+            id = entry['id']
+            for field, value in entry.items():
+                if field == 'id':
+                    continue
+                key = (model, id, field)
+                if key in self._values:
+                    self._discard(key)
+                size = sizeof(value) + self.entry_overhead
+                self._values[key] = (value, now, size)
+                self._fields[model, id].add(field)
+                self.nbytes += size
+
+            if version is not None:
+                self._versions[model, id] = version
+            self._unverified.discard((model, id))
+        self._evict()
+
+    def missing(self, model: str, ids: Iterable[int], fields: Iterable[str]) -> List[int]:
+        self._ensure_loaded(model)
+        fields = [f for f in fields if f != 'id']
+
+        def cached(id):
+            try:
+                for field in fields:
+                    self._lookup((model, id, field))
+            except KeyError:
+                return False
+            return True
+
+        return [i for i in ids if not cached(i)]
+
+    def validate(self, model: str, versions: Dict[int, Any]):
+        """
+        Invalidation hook. versions maps ids to their current write_date (or __last_update).
+        Records cached with a different version are dropped.
+        """
+        self._ensure_loaded(model)
+        stale = list()
+        for id, version in versions.items():
+            if (model, id) not in self._fields:
+                continue
+            if self._versions.get((model, id)) != version:
+                # an unknown version is treated as outdated as well
+                stale.append(id)
+            else:
+                self._unverified.discard((model, id))
+        if stale:
+            # a changed record may now match the domain of any scope, not only of those holding it
+            self._scopes.pop(model, None)
+            self.invalidate(model, stale)
+
+    def verify(self, model: str, ids: Iterable[int]):
+        """Mark entries as up to date without checking their versions, e.g. after an incremental sync"""
+        self._ensure_loaded(model)
+        self._unverified.difference_update((model, id) for id in ids)
+
+    def unverified(self, model: str, ids: Iterable[int]) -> List[int]:
+        """ids loaded from disk whose version has not been checked against the server yet"""
+        self._ensure_loaded(model)
+        return [id for id in ids if (model, id) in self._unverified]
+
+    def cover(self, model: str, key: Hashable, ids: Iterable[int]):
+        """Record that ids are all the records of model matching the domain with key, at this time"""
+        self._scopes[model][key] = (list(ids), time.monotonic())
+
+    def scopes(self, model: str) -> Dict[Hashable, List[int]]:
+        """domain key -> ids of the scopes of model that have not expired"""
+        scopes = self._scopes[model]
+        if self.ttl is not None:
+            now = time.monotonic()
+            for key in [key for key, (_, stored_at) in scopes.items() if now - stored_at > self.ttl]:
+                del scopes[key]
+        return dict((key, ids) for key, (ids, _) in scopes.items())
+
+    def invalidate(self, model: str, ids: Union[int, Iterable[int]]=None):
+        """
+        Drop the cached records ids (one id or several, default: all) of model, and the scopes holding any of
+        them, e.g. for records deleted on the server. The DiskStore deletes them in one transaction
+        """
+        if ids is None:
+            self._scopes.pop(model, None)
+            ids = [i for m, i in self._fields if m == model]
+            delete = None
+        else:
+            ids = delete = [ids] if isinstance(ids, int) else list(ids)
+            dropped = set(ids)
+            scopes = self._scopes.get(model, dict())
+            for key in [key for key, (scope, _) in scopes.items() if not dropped.isdisjoint(scope)]:
+                del scopes[key]
+
+        for i in ids:
+            for field in list(self._fields.get((model, i), ())):
+                self._discard((model, i, field))
+            self._versions.pop((model, i), None)
+            self._unverified.discard((model, i))
+            self.stats.invalidations += 1
+
+        if self.store is not None and (delete is None or delete):
+            self.store.delete(model, delete)
+
+    def clear(self, model: str=None):
+        if model is None:
+            self._values.clear()
+            self._fields.clear()
+            self._versions.clear()
+            self._unverified.clear()
+            self._scopes.clear()
+            self.nbytes = 0
+            if self.store is not None:
+                self.store.clear()
+        else:
+            self.invalidate(model)
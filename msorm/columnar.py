@@ -0,0 +1,276 @@
+"""
+Column oriented storage of the entries of one model.
+
+Every field is kept in a single column ordered by row, next to an id -> row index. Columns holding only
+ints, floats or bools are stored as typed arrays (8 bytes per int/float, 1 per bool instead of a pointer
+to a boxed object) and can be exposed to numpy without copying. Other columns are plain lists in which
+strings are interned, so the few distinct values of selection fields ("open", "draft", ...) are shared
+by every row.
+
+Fields can also be indexed: a hash index maps every value of the field to the ids holding it, and is kept
+up to date as entries are added or overwritten, so lookups and groupings by e.g. member_id cost O(1).
+"""
+import sys
+from array import array
+from types import MappingProxyType
+from typing import Any, Dict, Hashable, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+
+
+class BoolArray(array):
+    """array of int8 that hands out bools"""
+    def __new__(cls, values=()):
+        return super().__new__(cls, 'b', values)
+
+    def __getitem__(self, i):
+        value = super().__getitem__(i)
+        if isinstance(i, slice):
+            return [bool(v) for v in value]
+        return bool(value)
+
+    def __iter__(self):
+        return (bool(v) for v in super().__iter__())
+
+    def __reduce__(self):
+        return type(self), (list(self),)
+
+
+Column = Union[array, List[Any]]
+# python type of the values -> constructor of the typed column holding them
+TYPED = {
+    bool: BoolArray,
+    int: lambda values=(): array('q', values),
+    float: lambda values=(): array('d', values),
+}
+
+
+def _value_type(values: Sequence) -> Optional[type]:
+    """The type all values share, if a typed column can hold them"""
+    types = set(map(type, values))
+    if len(types) == 1:
+        value_type = types.pop()
+        if value_type in TYPED:
+            return value_type
+    return None
+
+
+def _column_type(column: Column) -> Optional[type]:
+    if isinstance(column, BoolArray):
+        return bool
+    if isinstance(column, array):
+        return int if column.typecode == 'q' else float
+    return None
+
+
+def _intern(values: Iterable) -> List[Any]:
+    return [sys.intern(v) if type(v) is str else v for v in values]
+
+
+def index_keys(value) -> Tuple[Hashable, ...]:
+    """Keys a value is indexed under: the id of a many2one, every id of an x2many, None for False"""
+    if isinstance(value, (list, tuple)):
+        if len(value) == 2 and isinstance(value[1], str):
+            return (value[0],)
+        return tuple(value)
+    return (None if value is False else value,)
+
+
+def make_column(values: Sequence) -> Column:
+    value_type = _value_type(values)
+    if value_type is not None:
+        try:
+            return TYPED[value_type](values)
+        except OverflowError:
+            pass
+    return _intern(values)
+
+
+class ColumnStore:
+    """
+    Entries of a model as one column per field.
+
+    Adding a column costs O(rows) and leaves the other columns alone. Typed columns turn into lists
+    when a value of another type (e.g. odoo's False for an empty value) arrives.
+
+    Arrays handed out by to_numpy() share memory with the store. While such a view is alive the typed
+    columns it covers cannot grow (BufferError), so export once the store is filled.
+    """
+    def __init__(self, indexes: Iterable[str]=()):
+        self.ids = array('q')
+        self.index: Dict[int, int] = dict()
+        self.columns: Dict[str, Column] = dict()
+        # secondary indexes: field -> key (see index_keys) -> ids, in the order they were indexed
+        self.indexes: Dict[str, Dict[Hashable, List[int]]] = dict()
+        for field in indexes:
+            self.add_index(field)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, id):
+        return id in self.index
+
+    def __repr__(self):
+        return f'<ColumnStore rows={len(self)} fields={list(self.columns)}>'
+
+    @property
+    def fields(self):
+        return tuple(self.columns)
+
+    def row(self, id: int) -> tuple:
+        """Values of all fields of id in the order of fields. Raises KeyError for unknown ids"""
+        r = self.index[id]
+        return tuple(column[r] for column in self.columns.values())
+
+    def get(self, id: int, field: str):
+        return self.columns[field][self.index[id]]
+
+    def column(self, field: str) -> Column:
+        if field == 'id':
+            return self.ids
+        return self.columns[field]
+
+    def _degrade(self, field):
+        column = self.columns[field]
+        if _column_type(column) is not None:
+            column = self.columns[field] = list(column)
+        return column
+
+    def _append(self, field: str, values: List[Any]):
+        column = self.columns[field]
+        value_type = _column_type(column)
+        if value_type is not None and (not values or _value_type(values) is value_type):
+            try:
+                column.extend(values)
+                return
+            except OverflowError:
+                pass
+        self._degrade(field).extend(_intern(values))
+
+    def _set(self, field: str, row: int, value):
+        column = self.columns[field]
+        if _column_type(column) is type(value):
+            try:
+                column[row] = value
+                return
+            except OverflowError:
+                pass
+        self._degrade(field)[row] = sys.intern(value) if type(value) is str else value
+
+    def extend(self, entries: Iterable[Mapping[str, Any]]):
+        """
+        Add entries (dicts with at least an "id"). Entries of known ids overwrite the stored values.
+        Fields missing from an entry are None.
+        """
+        fresh: Dict[int, Mapping[str, Any]] = dict()
+        fields = dict()
+        for entry in entries:
+            fields.update(dict.fromkeys(entry))
+            id = entry['id']
+            row = self.index.get(id)
+            if row is None:
+                fresh[id] = entry
+                continue
+            for field, value in entry.items():
+                if field == 'id':
+                    continue
+                if field not in self.columns:
+                    self.columns[field] = [None] * len(self)
+                if field in self.indexes:
+                    self._unindex(field, id, self.columns[field][row])
+                    self._index(field, id, value)
+                self._set(field, row, value)
+        fields.pop('id', None)
+
+        if not fresh:
+            return
+
+        empty = not self.ids
+        for field in {**dict.fromkeys(self.columns), **fields}:
+            values = [entry.get(field) for entry in fresh.values()]
+            if empty or field not in self.columns:
+                if empty:
+                    self.columns[field] = make_column(values)
+                else:
+                    self.columns[field] = [None] * len(self)
+                    self._append(field, values)
+            else:
+                self._append(field, values)
+
+        start = len(self.ids)
+        self.ids.extend(fresh)
+        self.index.update(zip(fresh, range(start, len(self.ids))))
+        for field in self.indexes:
+            for id, entry in fresh.items():
+                self._index(field, id, entry.get(field))
+
+    def add_column(self, field: str, values: Mapping[int, Any], default=None):
+        """Set field for every row from an id -> value mapping. ids not in the store are ignored"""
+        self.columns[field] = make_column([values.get(id, default) for id in self.ids])
+        if field in self.indexes:
+            self.add_index(field)
+
+    def _index(self, field: str, id: int, value):
+        index = self.indexes[field]
+        for key in index_keys(value):
+            index.setdefault(key, list()).append(id)
+
+    def _unindex(self, field: str, id: int, value):
+        index = self.indexes[field]
+        for key in index_keys(value):
+            ids = index[key]
+            ids.remove(id)
+            if not ids:
+                del index[key]
+
+    def add_index(self, field: str):
+        """Index field (again), see lookup and groups"""
+        self.indexes[field] = dict()
+        for id, value in zip(self.ids, self.columns.get(field, [None] * len(self))):
+            self._index(field, id, value)
+
+    def lookup(self, field: str, value) -> List[int]:
+        """ids whose field is (or for x2many fields, contains) value. Raises ValueError unless field is indexed"""
+        try:
+            index = self.indexes[field]
+        except KeyError:
+            raise ValueError(f'{field} is not indexed') from None
+        return list(index.get(index_keys(value)[0], ()))
+
+    def groups(self, field: str) -> Mapping[Hashable, List[int]]:
+        """Read-only view of the index of field: value -> ids"""
+        try:
+            return MappingProxyType(self.indexes[field])
+        except KeyError:
+            raise ValueError(f'{field} is not indexed') from None
+
+    def select(self, ids: Iterable[int]) -> 'ColumnStore':
+        """A new store with the rows of ids in that order. Unknown ids get None for every field"""
+        ids = list(dict.fromkeys(ids))
+        store = ColumnStore()
+        store.ids = array('q', ids)
+        store.index = dict(zip(ids, range(len(ids))))
+        rows = [self.index.get(id) for id in ids]
+        for field, column in self.columns.items():
+            store.columns[field] = make_column([None if r is None else column[r] for r in rows])
+        for field in self.indexes:
+            store.add_index(field)
+        return store
+
+    def to_numpy(self, field: str):
+        """The column as a numpy array. Typed columns are exposed without copying"""
+        import numpy as np
+        column = self.column(field)
+        value_type = _column_type(column)
+        if value_type is None:
+            values = np.empty(len(column), dtype=object)
+            values[:] = column
+            return values
+        return np.frombuffer(column, dtype=np.bool_ if value_type is bool else column.typecode)
+
+    def to_frame(self, fields: Optional[Iterable[str]]=None):
+        """The store as a pandas DataFrame indexed by id"""
+        import pandas as pd
+        fields = self.fields if fields is None else [f for f in fields if f != 'id']
+        return pd.DataFrame({field: self.to_numpy(field) for field in fields},
+                            index=pd.Index(self.to_numpy('id'), name='id'),
+                            copy=False)
@@ -0,0 +1,282 @@
+"""
+Domains as expression trees.
+
+An odoo domain in prefix notation, e.g. ['|', ['state', '=', 'open'], ['event_id', 'in', [1, 2]]], is parsed
+into Term leaves and Node('&' | '|' | '!', children) nodes and simplified to a canonical form:
+
+- nested nodes of the same operator are flattened, duplicates dropped and children sorted
+- negations are pushed down to the terms (as odoo does itself), e.g. ~(a = 1) becomes a != 1
+- "=" and "in" terms on the same field are merged: values are united under "|", and intersected under "&"
+  for "id" and fields known to be single-valued (for x2many fields "&" of two "in" terms is not an intersection)
+- constant terms are folded: an empty "in" can never match and an empty "not in" always does, so a domain
+  that simplifies to FALSE needs no round-trip at all
+
+Equivalent domains simplify to equal (and equally hashing) trees, which makes domain_key usable as a cache key.
+Term values compare by type as well, so "= 0" and "= False" (or "= 1" and "= True") stay apart.
+Filter expressions combine with &, | and ~ into Domain lists:
+
+    (Filter('state') == 'open') | (Filter('state') == 'draft') & ~(Filter('event_id') == 4)
+"""
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Tuple, Union
+
+TRUE_LEAF = (1, '=', 1)
+FALSE_LEAF = (0, '=', 1)
+
+NEGATIONS = {
+    '=': '!=', '!=': '=',
+    '<': '>=', '>=': '<',
+    '>': '<=', '<=': '>',
+    'in': 'not in', 'not in': 'in',
+    'like': 'not like', 'not like': 'like',
+    'ilike': 'not ilike', 'not ilike': 'ilike',
+}
+
+# field types whose "in" is "any of the related records in"
+MULTI_VALUED = ('one2many', 'many2many')
+
+
+class Term(NamedTuple):
+    field: str
+    op: str
+    value: Any
+
+    def _key(self):
+        return self.field, self.op, _typed(self.value)
+
+    # terms on 0 and False (or 1 and True) differ, although the values compare equal
+    def __eq__(self, other):
+        if not isinstance(other, Term):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        return hash(self._key())
+
+
+class Node(NamedTuple):
+    op: str
+    children: Tuple[Union[Term, 'Node'], ...]
+
+
+TRUE = Node('&', ())
+FALSE = Node('|', ())
+
+
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _value_key(value):
+    # False == 0 and True == 1, but they mean different things in a domain
+    return type(value).__name__, value
+
+
+def _typed(value):
+    """value (a frozen operand) with every element keyed by _value_key"""
+    if isinstance(value, tuple):
+        return tuple(_typed(v) for v in value)
+    return _value_key(value)
+
+
+def operand_values(value) -> Tuple:
+    """The distinct values of an "in" operand in canonical order"""
+    values = value if isinstance(value, (list, tuple)) else (value,)
+    try:
+        return tuple(v for _, v in sorted(dict.fromkeys(_value_key(v) for v in values)))
+    except TypeError:
+        return tuple(_freeze(values))
+
+
+def parse(domain) -> Union[Term, Node]:
+    """Tree of an odoo domain in prefix notation (the top level is an implicit "&")"""
+    if isinstance(domain, (Term, Node)):
+        return domain
+    stack: List[Union[Term, Node]] = list()
+    for item in reversed(list(domain)):
+        if item in ('&', '|'):
+            if len(stack) < 2:
+                raise ValueError(f'Operator "{item}" needs two operands in {domain}')
+            stack.append(Node(item, (stack.pop(), stack.pop())))
+        elif item == '!':
+            if not stack:
+                raise ValueError(f'Operator "!" needs an operand in {domain}')
+            stack.append(Node('!', (stack.pop(),)))
+        elif isinstance(item, (list, tuple)) and len(item) == 3:
+            stack.append(Term(item[0], item[1], _freeze(item[2])))
+        else:
+            raise ValueError(f'Invalid domain element {item!r} in {domain}')
+    if len(stack) == 1:
+        return stack[0]
+    return Node('&', tuple(reversed(stack)))
+
+
+def _negate(node: Union[Term, Node]) -> Union[Term, Node]:
+    if isinstance(node, Term):
+        if node.op in NEGATIONS:
+            return Term(node.field, NEGATIONS[node.op], node.value)
+        return Node('!', (node,))
+    if node.op == '!':
+        return node.children[0]
+    # de morgan
+    return Node('|' if node.op == '&' else '&', tuple(_negate(child) for child in node.children))
+
+
+def _simplify_term(term: Term) -> Union[Term, Node]:
+    if tuple(term) == TRUE_LEAF:
+        return TRUE
+    if tuple(term) == FALSE_LEAF:
+        return FALSE
+    if term.op in ('in', 'not in'):
+        values = operand_values(term.value)
+        if not values:
+            return FALSE if term.op == 'in' else TRUE
+        if len(values) == 1 and not isinstance(values[0], tuple):
+            return Term(term.field, '=' if term.op == 'in' else '!=', values[0])
+        return Term(term.field, term.op, values)
+    return term
+
+
+def _merge(op: str, terms: List[Term], types: Mapping[str, str]) -> List[Union[Term, Node]]:
+    """Merge the "=" and "in" terms of an op node on the same field into one term"""
+    by_field: Dict[str, List[Term]] = dict()
+    rest = list()
+    for term in terms:
+        if term.op == 'in' or (term.op == '=' and not isinstance(term.value, tuple)):
+            by_field.setdefault(term.field, list()).append(term)
+        else:
+            rest.append(term)
+
+    for field, group in by_field.items():
+        if len(group) == 1:
+            rest.extend(group)
+            continue
+        if op == '|':
+            values = [v for term in group for v in operand_values(term.value)]
+            rest.append(_simplify_term(Term(field, 'in', values)))
+        elif field == 'id' or (field in types and types[field] not in MULTI_VALUED):
+            keys = set.intersection(*(set(_value_key(v) for v in operand_values(term.value)) for term in group))
+            rest.append(_simplify_term(Term(field, 'in', [v for _, v in keys])))
+        else:
+            rest.extend(group)
+    return rest
+
+
+def simplify(node: Union[Term, Node], types: Optional[Mapping[str, str]]=None) -> Union[Term, Node]:
+    """
+    Canonical form of node. types (field name -> odoo field type) tells which fields are single-valued,
+    so "&" of their "in" terms may be intersected. Without it only "id" terms are intersected.
+    """
+    types = types or dict()
+    if isinstance(node, Term):
+        return _simplify_term(node)
+    if node.op == '!':
+        child = simplify(node.children[0], types)
+        if child == TRUE or child == FALSE:
+            return FALSE if child == TRUE else TRUE
+        negated = _negate(child)
+        return negated if negated.op == '!' else simplify(negated, types)
+
+    absorbing, neutral = (FALSE, TRUE) if node.op == '&' else (TRUE, FALSE)
+    children = list()
+    for child in (simplify(child, types) for child in node.children):
+        if child == absorbing:
+            return absorbing
+        if child == neutral:
+            continue
+        if isinstance(child, Node) and child.op == node.op:
+            children.extend(child.children)
+        else:
+            children.append(child)
+
+    terms = [child for child in children if isinstance(child, Term)]
+    children = [*_merge(node.op, terms, types), *(child for child in children if not isinstance(child, Term))]
+    if absorbing in children:
+        return absorbing
+    children = sorted(set(child for child in children if child != neutral), key=repr)
+    if len(children) == 1:
+        return children[0]
+    return Node(node.op, tuple(children))
+
+
+def _thaw(value):
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    return value
+
+
+def to_domain(node: Union[Term, Node], top: bool=True) -> List:
+    """odoo domain in prefix notation. The top level "&" is left implicit"""
+    if node == TRUE:
+        return list() if top else [list(TRUE_LEAF)]
+    if node == FALSE:
+        return [list(FALSE_LEAF)]
+    if isinstance(node, Term):
+        return [[node.field, node.op, _thaw(node.value)]]
+
+    children = [item for child in node.children for item in to_domain(child, top=False)]
+    if node.op == '!':
+        return ['!', *children]
+    if node.op == '&' and top:
+        return [item for child in node.children for item in to_domain(child, top=True)]
+    return [node.op] * (len(node.children) - 1) + children
+
+
+def domain_key(domain, types: Optional[Mapping[str, str]]=None) -> Union[Term, Node]:
+    """Hashable canonical form of domain. Equivalent domains give equal keys"""
+    return simplify(parse(domain), types)
+
+
+def normalize_domain(domain, types: Optional[Mapping[str, str]]=None) -> List:
+    """domain in canonical form, as a plain list (xmlrpc cannot marshal list subclasses)"""
+    return to_domain(domain_key(domain, types))
+
+
+def is_false(domain) -> bool:
+    """Whether domain can never match, so searching it is pointless"""
+    return domain_key(domain) == FALSE
+
+
+class Domain(list):
+    """A domain in prefix notation that combines with &, | and ~ (and with + as an implicit "&")"""
+    @classmethod
+    def of(cls, op: str, *domains) -> 'Domain':
+        return cls(normalize_domain(Node(op, tuple(parse(domain) for domain in domains))))
+
+    def __and__(self, other):
+        return self.of('&', self, other)
+
+    def __rand__(self, other):
+        return self.of('&', other, self)
+
+    def __or__(self, other):
+        return self.of('|', self, other)
+
+    def __ror__(self, other):
+        return self.of('|', other, self)
+
+    def __invert__(self):
+        return self.of('!', self)
+
+    def __add__(self, other):
+        return Domain([*self, *other])
+
+    def __radd__(self, other):
+        return Domain([*other, *self])
+
+    def __eq__(self, other):
+        if not isinstance(other, list):
+            return NotImplemented
+        try:
+            return domain_key(self) == domain_key(other)
+        except ValueError:
+            return False
+
+    def __hash__(self):
+        return hash(domain_key(self))
+
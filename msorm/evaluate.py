@@ -0,0 +1,288 @@
+"""
+Local evaluation of domains against entries held in memory.
+
+A domain (see domain.py) is evaluated one term at a time over whole columns, into boolean masks that are
+combined with numpy. Typed columns of a ColumnStore (ints, floats, bools) are compared without leaving
+numpy, other columns value by value.
+
+Values are compared the way odoo compares them in SQL, as far as read results tell:
+
+- False is null: it matches "= False", "!= <value>" and "not in", and never matches <, <=, >, >=, like or ilike
+- many2one values ([id, name]) compare by id, or by name when the operand is a string
+- x2many values (lists of ids) match "=" and "in" when any of their ids does
+- like/ilike match SQL patterns (% and _) anywhere in the value, =like/=ilike match them against the whole value
+- <, <=, >, >= only order numbers and dates (also as odoo's date strings), since the database orders
+  text by its collation
+- child_of and parent_of are evaluated on "id" along the parent_id column, when the whole hierarchy is held
+
+Anything else (dotted paths, fields that are not held, other operators, values that do not compare)
+raises NotEvaluable, so callers can ask the server instead.
+"""
+import operator
+import re
+from array import array
+from typing import Any, Callable, Dict, Hashable, List, Mapping, Optional, Sequence, Union
+
+from .columnar import ColumnStore
+from .domain import FALSE, TRUE, Node, Term, _value_key, domain_key, operand_values
+from .normalize import columns_of
+
+ORDERING = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+LIKE = ('like', 'ilike', '=like', '=ilike', 'not like', 'not ilike')
+# odoo's date and datetime format, ordered alike as strings and in SQL
+DATE = re.compile(r'\d{4}-\d{2}-\d{2}( \d{2}:\d{2}:\d{2})?\Z')
+
+
+class NotEvaluable(ValueError):
+    """A domain that cannot be evaluated locally"""
+
+
+def _is_null(v):
+    return v is False or v is None
+
+
+def _is_many2one(v):
+    return isinstance(v, (list, tuple)) and len(v) == 2 and isinstance(v[1], str)
+
+
+def _equals(value) -> Callable[[Any], bool]:
+    if _is_null(value):
+        return lambda v: _is_null(v) or (isinstance(v, list) and not v)
+    by_name = isinstance(value, str)
+
+    def equals(v):
+        if _is_many2one(v):
+            return v[1 if by_name else 0] == value
+        if isinstance(v, (list, tuple)):
+            return value in v
+        return not _is_null(v) and v == value
+    return equals
+
+
+def _member(values) -> Callable[[Any], bool]:
+    null = any(_is_null(v) for v in values)
+    try:
+        lookup = set(v for v in values if not _is_null(v))
+    except TypeError:
+        raise NotEvaluable(f'Unhashable operand {values}') from None
+
+    def member(v):
+        if _is_null(v) or (isinstance(v, list) and not v):
+            return null
+        if _is_many2one(v):
+            return v[0] in lookup or v[1] in lookup
+        if isinstance(v, (list, tuple)):
+            return not lookup.isdisjoint(v)
+        return v in lookup
+    return member
+
+
+def _is_text(v):
+    return isinstance(v, str) and not DATE.match(v)
+
+
+def _ordered(op, value) -> Callable[[Any], bool]:
+    if _is_null(value):
+        return lambda v: False
+    if _is_text(value):
+        raise NotEvaluable(f'Cannot order by the collation of the database: {op} {value!r}')
+    compare = ORDERING[op]
+
+    def ordered(v):
+        if _is_null(v):
+            return False
+        if _is_many2one(v):
+            if isinstance(value, str):
+                raise NotEvaluable(f'Cannot order the name of {v} by the collation of the database')
+            v = v[0]
+        elif isinstance(v, (list, tuple)):
+            raise NotEvaluable(f'Cannot order the x2many value {v}')
+        elif _is_text(v):
+            raise NotEvaluable(f'Cannot order {v!r} by the collation of the database')
+        try:
+            return compare(v, value)
+        except TypeError:
+            raise NotEvaluable(f'Cannot compare {v!r} {op} {value!r}') from None
+    return ordered
+
+
+def _like_pattern(value) -> str:
+    """Regular expression of the SQL pattern value: % is any run of characters, _ any one, \\ escapes"""
+    pattern = list()
+    chars = iter(str(value))
+    for c in chars:
+        if c == '\\':
+            pattern.append(re.escape(next(chars, '\\')))
+        else:
+            pattern.append('.*' if c == '%' else '.' if c == '_' else re.escape(c))
+    return ''.join(pattern)
+
+
+def _like(op, value) -> Callable[[Any], bool]:
+    negate = op.startswith('not ')
+    op = op[4:] if negate else op
+    flags = re.IGNORECASE | re.DOTALL if op.endswith('ilike') else re.DOTALL
+    if op.startswith('='):
+        match = re.compile(_like_pattern(value) + r'\Z', flags).match
+    else:
+        # odoo wraps the operand in %, keeping its own % and _ as wildcards
+        match = re.compile(_like_pattern(value), flags).search
+
+    def like(v):
+        if _is_many2one(v):
+            v = v[1]
+        if _is_null(v):
+            return False
+        if not isinstance(v, str):
+            raise NotEvaluable(f'Cannot match {v!r} {op} {value!r}')
+        return bool(match(v)) != negate
+    return like
+
+
+def _predicate(term: Term) -> Callable[[Any], bool]:
+    op, value = term.op, term.value
+    if op == '=':
+        return _equals(value)
+    if op == '!=':
+        equals = _equals(value)
+        return lambda v: not equals(v)
+    if op in ('in', 'not in'):
+        member = _member(operand_values(value))
+        return member if op == 'in' else lambda v: not member(v)
+    if op in ORDERING:
+        return _ordered(op, value)
+    if op in LIKE:
+        return _like(op, value)
+    raise NotEvaluable(f'Operator "{op}" is not evaluated locally')
+
+
+def _typed_mask(column: array, term: Term):
+    """Mask of a term over a typed column computed by numpy, or None if the term needs the python path"""
+    import numpy as np
+    values = operand_values(term.value) if term.op in ('in', 'not in') else (term.value,)
+    is_bool = column.typecode == 'b'
+    if term.op not in ('=', '!=', 'in', 'not in', *ORDERING) or \
+            not all(isinstance(v, (int, float)) and (is_bool or not isinstance(v, bool)) for v in values):
+        return None
+
+    data = np.frombuffer(column, dtype=np.bool_ if is_bool else column.typecode)
+    if term.op in ('in', 'not in'):
+        mask = np.isin(data, values)
+        return mask if term.op == 'in' else ~mask
+    return {'=': operator.eq, '!=': operator.ne, **ORDERING}[term.op](data, term.value)
+
+
+def _hierarchy_mask(columns: Mapping[str, Sequence], term: Term):
+    import numpy as np
+    if term.field != 'id' or 'parent_id' not in columns:
+        raise NotEvaluable(f'{term.op} is only evaluated on "id" of entries holding parent_id')
+    parent = dict((id, p[0] if _is_many2one(p) else p or None)
+                  for id, p in zip(columns['id'], columns['parent_id']))
+    roots = set(operand_values(term.value))
+
+    def ancestors(id):
+        """id and its ancestors, up to the root of the hierarchy"""
+        chain = list()
+        while id is not None:
+            if id not in parent:
+                raise NotEvaluable(f'Record {id} of the hierarchy is not held')
+            chain.append(id)
+            id = parent[id]
+        return chain
+
+    if term.op == 'child_of':
+        return np.fromiter((not roots.isdisjoint(ancestors(id)) for id in columns['id']), dtype=bool)
+    lineage = set(a for root in roots for a in ancestors(root))
+    return np.fromiter((id in lineage for id in columns['id']), dtype=bool)
+
+
+def _term_mask(columns: Mapping[str, Sequence], term: Term):
+    import numpy as np
+    if term.op == '=?':
+        if _is_null(term.value):
+            return np.ones(len(columns['id']), dtype=bool)
+        term = Term(term.field, '=', term.value)
+    if term.op in ('child_of', 'parent_of'):
+        return _hierarchy_mask(columns, term)
+    if term.field not in columns:
+        raise NotEvaluable(f'Field "{term.field}" is not held')
+
+    column = columns[term.field]
+    if isinstance(column, array):
+        mask = _typed_mask(column, term)
+        if mask is not None:
+            return mask
+    return np.fromiter(map(_predicate(term), column), dtype=bool, count=len(column))
+
+
+def _mask(columns: Mapping[str, Sequence], node: Union[Term, Node]):
+    import numpy as np
+    if node == TRUE or node == FALSE:
+        return np.full(len(columns['id']), node == TRUE)
+    if isinstance(node, Term):
+        return _term_mask(columns, node)
+    masks = [_mask(columns, child) for child in node.children]
+    if node.op == '!':
+        return ~masks[0]
+    return (np.logical_and if node.op == '&' else np.logical_or).reduce(masks)
+
+
+def evaluate(columns: Mapping[str, Sequence], domain):
+    """Boolean numpy mask of the rows of columns (field -> values, including "id") matching domain"""
+    return _mask(columns, domain_key(domain))
+
+
+def select(store: ColumnStore, domain) -> List[int]:
+    """ids of the entries of store matching domain, in store order"""
+    mask = evaluate({'id': store.ids, **store.columns}, domain)
+    return [id for id, match in zip(store.ids, mask) if match]
+
+
+def filter_entries(entries: Sequence[Dict[str, Any]], domain) -> List[Dict[str, Any]]:
+    """The entries (dicts or Rows) matching domain, in order"""
+    if not entries:
+        return list()
+    mask = evaluate(columns_of(entries), domain)
+    return [entry for entry, match in zip(entries, mask) if match]
+
+
+def fields_of(node: Union[Term, Node]) -> List[str]:
+    """The fields a domain key refers to"""
+    if isinstance(node, Term):
+        if node.op in ('child_of', 'parent_of'):
+            return [node.field, 'parent_id']
+        return [node.field] if isinstance(node.field, str) else list()
+    return list(dict.fromkeys(field for child in node.children for field in fields_of(child)))
+
+
+def _conjuncts(node: Union[Term, Node]) -> Sequence[Union[Term, Node]]:
+    if isinstance(node, Node) and node.op == '&':
+        return node.children
+    return (node,)
+
+
+def _implies(d: Union[Term, Node], c: Union[Term, Node]) -> bool:
+    if d == c:
+        return True
+    # x = 1 implies x in (1, 2), also for x2many fields
+    return isinstance(d, Term) and isinstance(c, Term) and d.field == c.field and \
+        d.op in ('=', 'in') and c.op in ('=', 'in') and \
+        set(map(_value_key, operand_values(d.value))) <= set(map(_value_key, operand_values(c.value)))
+
+
+def implies(node: Union[Term, Node], scope: Union[Term, Node]) -> bool:
+    """Whether every record matching domain key node also matches domain key scope"""
+    return all(any(_implies(d, c) for d in _conjuncts(node)) for c in _conjuncts(scope))
+
+
+def candidates(node: Union[Term, Node], scopes: Mapping[Hashable, List[int]]) -> Optional[List[int]]:
+    """
+    ids that provably include every record matching domain key node: those of an "id" term, or of the
+    smallest scope (complete search result, see RecordCache.scopes) node implies. None if there are none
+    """
+    for term in _conjuncts(node):
+        if isinstance(term, Term) and term.field == 'id' and term.op in ('=', 'in'):
+            return list(operand_values(term.value))
+
+    covering = [ids for scope, ids in scopes.items() if implies(node, scope)]
+    return min(covering, key=len, default=None)
@@ -0,0 +1,79 @@
+"""
+DataFrame (pandas) and Table (pyarrow) construction straight from decoded Rows.
+
+Fields are normalised as in normalize.py (many2one split into "<field>" and "<field>_name", False as null),
+with typed columns instead of python objects: date/datetime strings are parsed in one vectorized call
+per column, and one2many/many2many id lists are kept as list columns.
+
+pandas and pyarrow are imported on first use.
+"""
+from typing import Dict
+
+from .normalize import columns_of, normalize_columns, nullify
+from .xmlparse import Rows
+
+DATE_FORMAT = '%Y-%m-%d'
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _pandas_column(kind, values):
+    import numpy as np
+    import pandas as pd
+    if kind == 'bool':
+        return np.fromiter(values, dtype=bool, count=len(values))
+    if kind == 'int':
+        return pd.array(nullify(values), dtype='Int64')
+    if kind == 'float':
+        return np.array(nullify(values), dtype=float)
+    if kind == 'str':
+        return pd.array(nullify(values), dtype='string')
+    if kind == 'date':
+        return pd.to_datetime(nullify(values), format=DATE_FORMAT, errors='coerce')
+    if kind == 'datetime':
+        # odoo stores datetimes in UTC
+        return pd.to_datetime(nullify(values), format=DATETIME_FORMAT, errors='coerce', utc=True)
+    column = np.empty(len(values), dtype=object)
+    column[:] = values if kind == 'list' else nullify(values)
+    return column
+
+
+def _arrow_column(kind, values):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    if kind == 'bool':
+        return pa.array(values, pa.bool_())
+    if kind == 'int':
+        return pa.array(nullify(values), pa.int64())
+    if kind == 'float':
+        return pa.array(nullify(values), pa.float64())
+    if kind == 'str':
+        return pa.array(nullify(values), pa.string())
+    if kind == 'date':
+        strings = pa.array(nullify(values), pa.string())
+        return pc.strptime(strings, format=DATE_FORMAT, unit='s').cast(pa.date32())
+    if kind == 'datetime':
+        strings = pa.array(nullify(values), pa.string())
+        return pc.strptime(strings, format=DATETIME_FORMAT, unit='s').cast(pa.timestamp('s', tz='UTC'))
+    if kind == 'list':
+        return pa.array(values, pa.list_(pa.int64()))
+    return pa.array(nullify(values))
+
+
+def to_pandas(rows: Rows, types: Dict[str, str]):
+    """DataFrame indexed by id. types maps field names to odoo field types (as from fields_get)"""
+    import pandas as pd
+    columns = normalize_columns(columns_of(rows), types, _pandas_column)
+    index = pd.Index(columns.pop('id'), name='id') if 'id' in columns else None
+    return pd.DataFrame(columns, index=index, copy=False)
+
+
+def to_arrow(rows: Rows, types: Dict[str, str]):
+    import pyarrow as pa
+    columns = normalize_columns(columns_of(rows), types, _arrow_column)
+    return pa.table(columns)
+
+
+BACKENDS = {
+    'pandas': to_pandas,
+    'arrow': to_arrow,
+}
@@ -2,8 +2,9 @@ from abc import ABC, abstractmethod
 from xmlrpc.client import ServerProxy
 
 import functools
+import logging
 import sys
-from collections import MutableMapping
+from collections.abc import MutableMapping
 
 from getpass import getpass
 import pathlib
@@ -15,6 +16,13 @@ import asyncio
 from aioxmlrpc.client import ServerProxy as AioServerProxy
 from configparser import ConfigParser
 
+from .batch import Batcher
+from .cache import DiskStore, RecordCache
+from .planner import Planner
+from .scheduler import Priority, Scheduler
+from .schema import SchemaRegistry
+from .transport import ConnectionPool, PoolConfig, make_transport
+
 from typing import Any, Union
 
 CONFIG_DIR = pathlib.Path(os.environ.get('MS_CONFIG_DIR', default='~/.ms'))
@@ -137,6 +145,23 @@ class CredentialsBase(ABC):
     def uid(self, uid: Union[str, type(None)]):
         pass
 
+    @property
+    def store_path(self) -> Path:
+        """SQLite file holding the persisted records and schemas of the database"""
+        config_dir = CONFIG_DIR.expanduser()
+        config_dir.mkdir(parents=True, exist_ok=True)
+        return config_dir.joinpath(f'{self.db}.sqlite')
+
+    @property
+    def transport(self) -> str:
+        """RPC protocol, xmlrpc or jsonrpc"""
+        return 'xmlrpc'
+
+    @property
+    def compression(self) -> str:
+        """none, response or both"""
+        return 'response'
+
     @abstractmethod
     def get_or_set(self, key, prompt: str, passw=False, force=False) -> Any:
         pass
@@ -255,6 +280,21 @@ class Credentials(CredentialsBase):
     def dbpass(self):
         return self.get_or_set(passw=True, key='dbpass', prompt='Enter code for {user}@{db}: ')
 
+    @property
+    def store_path(self):
+        self.ensure_conf_dir()
+        return self.ms_conf_dir.joinpath(f'{self.db}.sqlite')
+
+    @property
+    def transport(self):
+        """RPC protocol used to talk to the server. set "transport = jsonrpc" in databases.ini to switch"""
+        return self.storage.get('transport', 'xmlrpc')
+
+    @property
+    def compression(self):
+        """none, response or both. set "compression = both" in databases.ini to also gzip large requests"""
+        return self.storage.get('compression', 'response')
+
     def get_db_list(self, domain=None):
         domain = domain or self.domain
         return ServerProxy(f'https://{domain}/xmlrpc/2/db').list()
@@ -271,14 +311,39 @@ class Credentials(CredentialsBase):
 
 
 class Requester:
-    def __init__(self, credentials: CredentialsBase):
+    def __init__(self,
+                 credentials: CredentialsBase,
+                 pool_config: PoolConfig=None,
+                 max_in_flight: int=None,
+                 persistent_cache=False,
+                 persistent_schema=True,
+                 batch_window: float=None):
         self.cred = credentials
-        self.common = AioServerProxy(f'https://{self.cred.domain}/xmlrpc/2/common')
-        self.models = AioServerProxy(f'https://{self.cred.domain}/xmlrpc/2/object')
-
-    async def execute_kw(self, *args, **kwargs):
+        self.pool = ConnectionPool(pool_config)
+        self.transport = make_transport(self.cred.transport, self.pool, self.cred.domain, self.cred.compression)
+        # by default keep exactly as many requests in flight as there are warm connections
+        self.scheduler = Scheduler(max_in_flight or self.pool.config.limit_per_host)
+        # records and schemas share one SQLite file per database
+        self.store = DiskStore(self.cred.store_path) if persistent_cache or persistent_schema else None
+        self.cache = RecordCache(store=self.store if persistent_cache else None)
+        self.schema = SchemaRegistry(self, store=self.store if persistent_schema else None)
+        # with a batch_window all calls are coalesced. otherwise only calls made inside batch()
+        self.batcher = Batcher(self.transport, self.scheduler, window=batch_window,
+                               store=self.store if persistent_schema else None, domain=self.cred.domain)
+        # shares identical concurrent calls and merges concurrent reads of the same model
+        self.planner = Planner(self._execute_kw)
+
+    def batch(self):
+        """Coalesce the calls issued inside this block into as few round-trips as possible"""
+        return self.batcher.batch()
+
+    async def execute_kw(self, model, *args, priority: Priority=Priority.NORMAL, rows: bool=False, **kwargs):
+        """
+        Call method (args[0]) on model. priority picks the scheduler lane, and with rows=True a list of
+        entries is returned as xmlparse.Rows (tuples sharing one field tuple) instead of dicts.
+        """
         try:
-            return await self.models.execute_kw(self.cred.db, self.cred.uid, self.cred.dbpass, *args, kwargs)
+            return await self.planner.call(model, *args, priority=priority, rows=rows, **kwargs)
         except xmlrpc.client.Fault as exc:
             if exc.faultCode == 3:
                 print('Credentials ot working. trying re-login')
@@ -286,13 +351,43 @@ class Requester:
                 raise
 
         await self.login(force=True)
-        return self.models.execute_kw(self.cred.db, self.cred.uid, self.cred.dbpass, *args, kwargs)
+        return await self.planner.call(model, *args, priority=priority, rows=rows, **kwargs)
+
+    async def _execute_kw(self, model, *args, priority: Priority, rows: bool, **kwargs):
+        params = (self.cred.db, self.cred.uid, self.cred.dbpass, model, *args, kwargs)
+        if self.batcher.active and not rows:
+            return await self.batcher.call('object', 'execute_kw', params, key=model, priority=priority)
+        return await self.scheduler.run(model, priority,
+                                        functools.partial(self.transport.call, 'object', 'execute_kw', *params,
+                                                          rows=rows))
+
+    async def stream_kw(self, model, *args, priority: Priority=Priority.NORMAL, **kwargs):
+        """
+        Like execute_kw for methods returning a list, but yields the entries while the response is still
+        being received and decoded. The call holds one scheduler slot until the stream is exhausted.
+        """
+        for attempt in range(2):
+            yielded = False
+            await self.scheduler.acquire(model, priority)
+            try:
+                params = (self.cred.db, self.cred.uid, self.cred.dbpass, model, *args, kwargs)
+                async for item in self.transport.stream('object', 'execute_kw', *params):
+                    yielded = True
+                    yield item
+                return
+            except xmlrpc.client.Fault as exc:
+                if exc.faultCode != 3 or yielded or attempt:
+                    raise
+                print('Credentials ot working. trying re-login')
+            finally:
+                self.scheduler.release()
+            await self.login(force=True)
 
     async def login(self, force=False):
         if self.cred.uid is not None and not force:
             return
 
-        uid = await self.common.authenticate(self.cred.db, self.cred.mno, self.cred.dbpass, {})
+        uid = await self.transport.call('common', 'authenticate', self.cred.db, self.cred.mno, self.cred.dbpass, {})
         if uid is not False:
             self.cred.uid = uid
             return
@@ -327,11 +422,23 @@ choice: """))
         self.close()
 
     async def __aexit__(self, *args):
-        return self.__exit__(*args)
+        await self.close()
 
     def close(self):
-        self.common.close()
-        self.models.close()
+        """
+        Close the connection pool and the disk store. Inside a running loop the pool is closed by a task that is
+        returned, so "await req.close()" waits for it. Outside of a loop the pool is closed before returning.
+        """
+        logging.debug(f'Closing requester: {self.transport.stats}, {self.planner.stats}, {self.batcher.stats}, '
+                      f'{self.cache.stats}')
+        if self.store is not None:
+            self.store.close()
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self.pool.close_blocking()
+            return None
+        return asyncio.ensure_future(self.pool.close())
 
 
 async def get_dblist(credentials):
@@ -341,9 +448,9 @@ async def get_dblist(credentials):
 
 async def main(loop):
     models = Requester(Credentials())
-    for m in (await models.get_model_fields('event.event')):
+    for m in (await models.schema.fields('event.event')).items():
         pprint(m)
-    models.close()
+    await models.close()
 
 
 if __name__ == '__main__':
@@ -1,12 +1,24 @@
+import asyncio
 import logging
-from collections import UserDict, namedtuple
+from collections import namedtuple
+from collections.abc import Mapping
 import sys
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Optional, Sequence
 
 from aioxmlrpc.client import Fault
 
+from . import frames
+from .aggregate import group_entries
+from .columnar import ColumnStore
+from .domain import Domain, domain_key, is_false, normalize_domain
+from .evaluate import NotEvaluable, candidates, fields_of, filter_entries, select
 from .login import Requester
+from .normalize import normalize
+from .records import to_records
+from .recordset import Prefetch, RecordSet
+from .xmlparse import Rows
 import builtins
+import copy
 import re
 import functools
 
@@ -31,6 +43,56 @@ class need_properties:
 need_ids = need_properties('ids')
 
 
+def _read_kwargs(kwargs):
+    """The kwargs of a search_read that apply to a read of its result. read takes no limit, offset or order"""
+    return dict((k, v) for k, v in kwargs.items() if k in ('fields', 'context'))
+
+
+# how odoo (old and new) and other XML-RPC servers fault on a model without read_group
+NO_READ_GROUP = re.compile(r"""no attribute '?read_group|["']read_group["'] (does not exist|is not supported)""")
+
+
+def chunks(seq: Sequence, size: int):
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+def merge_unique(results: List[List[Any]]):
+    """Concatenate chunked results (entries or bare ids) keeping the first occurrence of each id"""
+    seen = set()
+    merged = list()
+    for res in results:
+        for entry in res:
+            i = entry['id'] if isinstance(entry, dict) else entry
+            if i in seen:
+                continue
+            seen.add(i)
+            merged.append(entry)
+    return merged
+
+
+def merge_rows(results: List[Rows], fields: Sequence[str]=('id',)):
+    """merge_unique for results decoded as Rows. Empty results decode as plain lists"""
+    results = [res for res in results if isinstance(res, Rows) and res]
+    if not results:
+        return Rows(tuple(fields))
+
+    fields = results[0].fields
+    i = fields.index('id')
+    seen = set()
+    merged = Rows(fields)
+    for res in results:
+        if res.fields != fields:
+            order = [res.fields.index(f) for f in fields]
+            res = [tuple(row[j] for j in order) for row in res]
+        for row in res:
+            if row[i] in seen:
+                continue
+            seen.add(row[i])
+            merged.append(row)
+    return merged
+
+
 class Filter(list):
     typecasts = re.compile('([a-z]+)\((.+)\)')
 
@@ -76,8 +138,24 @@ class Filter(list):
         other.extend(self)
         return other
 
+    def __and__(self, other):
+        return Domain(self) & other
+
+    def __rand__(self, other):
+        return other & Domain(self)
+
+    def __or__(self, other):
+        return Domain(self) | other
+
+    def __ror__(self, other):
+        return other | Domain(self)
+
+    def __invert__(self):
+        return ~Domain(self)
+
     @classmethod
-    def make_filters(cls, filters, **kwfilters):
+    def make_filters(cls, filters, **kwfilters) -> Domain:
+        """filters and kwfilters as one domain in canonical form, see domain.py"""
 
         _filters = list(filters)
         for field, filt in kwfilters.items():
@@ -88,7 +166,6 @@ class Filter(list):
                     op, val = f.strip(' ').split(' ')
                     tc = cls.typecasts.findall(val)
                     if tc:
-                        print(tc)
                         _tc = lambda _val: getattr(builtins, tc[0][0])(_val)
                         val = tc[0][-1]
 
@@ -99,45 +176,110 @@ class Filter(list):
                     elif tc:
                         val = _tc(val)
 
-                    print(val)
                     _filters.append([field, op, val])
-        return _filters
+        return normalize_domain(_filters)
 
 
-class ModelBase(UserDict):
+class ModelBase(Mapping):
+    """
+    An odoo model. Entries held by the instance are kept in a ColumnStore and read as id -> entry_type
+    """
     model_name = None
-    permitted_fields = ['id']
     default_fields = ['id']
+    # read along with any field a RecordSet of this model loads. None for default_fields
+    prefetch_fields: Optional[List[str]] = None
+    # fields the held entries are hash indexed by, see lookup and groups
+    indexed_fields: Sequence[str] = ()
+    # ids per "read" call and values per "in" filter operand per "search_read" call
+    read_chunk_size = 200
+    filter_chunk_size = 500
 
     def __init__(self,
                  requester: Requester,
                  model_name=None,
-                 entries: List[Dict[str, Any]] = None):
+                 entries: List[Dict[str, Any]] = None,
+                 ids: Optional[List[int]] = None):
         self.name = model_name or self.model_name
         self.req = requester
+        self.store = ColumnStore(self.indexed_fields)
+        self._entry_type = None
         if entries:
-            self.entry_type = namedtuple(f'{self.__class__.__name__}Entry', entries[0].keys())
-            entries = entries or dict()
-            super().__init__((i, self.entry_type(*entry))
-                             for i, entry in entries.items())
-        else:
-            self.entry_type = None
+            self.store.extend(entries)
+        elif ids:
+            self.ids = ids
 
-    def _set(self, entry_list, fields, prev_entries):
-        self.entry_type = namedtuple(self.entry_type.__name__,
-                                     [*self.entry_type._fields, *fields])
+    @property
+    def entry_type(self):
+        fields = ('id', *self.store.fields)
+        if self._entry_type is None or self._entry_type._fields != fields:
+            # "__last_update" is not a valid attribute name and is renamed to its position
+            self._entry_type = namedtuple(f'{self.__class__.__name__}Entry', fields, rename=True)
+        return self._entry_type
 
-        def get_values(ent):
-            for field in fields:
-                yield ent[field]
+    def __getitem__(self, id):
+        return self.entry_type(id, *self.store.row(id))
 
-        for entry in entry_list:
-            i = entry.pop('id')
-            self[i] = self.entry_type(*self[i], *get_values(entry))
+    def __iter__(self):
+        return iter(self.store.ids)
+
+    def __len__(self):
+        return len(self.store)
+
+    def __contains__(self, id):
+        return id in self.store
+
+    def extend(self, entries: Iterable[Dict[str, Any]]) -> 'ModelBase':
+        """Hold entries as well. Entries of held ids are updated, and so are the indexes"""
+        self.store.extend(entries)
+        return self
+
+    def lookup(self, field: str, value) -> List[Any]:
+        """Held entries whose (indexed) field is, or for x2many fields contains, value"""
+        return [self[id] for id in self.store.lookup(field, value)]
+
+    def groups(self, field: str) -> Mapping:
+        """value -> ids of the held entries, by indexed field. many2one fields are grouped by id"""
+        return self.store.groups(field)
+
+    def _set(self, entry_list, fields):
+        for field in fields:
+            self.store.add_column(field, dict((entry['id'], entry[field]) for entry in entry_list))
 
     @property
     def ids(self):
-        return list(self.ids)
+        return list(self.store.ids)
+
+    def where(self, filters, **kwfilters) -> 'ModelBase':
+        """A copy holding only the held entries matching filters, evaluated locally (see evaluate.py)"""
+        subset = copy.copy(self)
+        subset.store = self.store.select(select(self.store, Filter.make_filters(filters, **kwfilters)))
+        return subset
+
+    @ids.setter
+    def ids(self, ids):
+        self.store = self.store.select(ids)
+
+    async def add_fields(self, *fields, **kwargs):
+        """Fetch fields for the held ids and add them as columns"""
+        fields = [f for f in fields if f not in self.store.fields and f != 'id']
+        if fields and self.store.ids:
+            self._set(await self.get_entries(*fields, ids=self.ids, **kwargs), fields)
+        return self
+
+    def related(self, model_name) -> 'ModelBase':
+        """The model class registered for model_name, on the same requester"""
+        return model_for(self.req, model_name)
+
+    def browse(self, ids, prefetch_fields: Optional[List[str]]=None) -> RecordSet:
+        """Lazily loaded records of ids. see recordset.py"""
+        if prefetch_fields is None:
+            prefetch_fields = self.prefetch_fields or self.default_fields
+        ids = list(ids)
+        return RecordSet(self, ids, Prefetch(self, ids, prefetch_fields))
+
+    async def search(self, filters, prefetch_fields: Optional[List[str]]=None, **kwargs) -> RecordSet:
+        ids = await self._search_chunked(Filter.make_filters(filters), action='search', **kwargs)
+        return self.browse(ids, prefetch_fields)
 
     async def execute_kw(self, *args, **kwargs):
         try:
@@ -147,11 +289,31 @@ class ModelBase(UserDict):
             raise
 
     async def get_fields(self):
-        fields = await self.execute_kw(
-            'fields_get', [], attributes=['string', 'help', 'type'])
+        fields = await self.req.schema.fields(self.name)
 
         return dict((k, fields[k]) for k in sorted(fields))
 
+    async def field_types(self, *fields) -> Dict[str, str]:
+        """field name -> odoo field type, for fields or all fields"""
+        return await self.req.schema.types(self.name, fields)
+
+    async def find_permitted_fields(self, *fields) -> List[str]:
+        """The fields (default: all) the user may read. see SchemaRegistry.permitted_fields"""
+        return await self.req.schema.permitted_fields(self.name, fields)
+
+    async def check_fields(self, *fields):
+        """Raise ValueError for fields the model does not have"""
+        unknown = await self.req.schema.unknown(self.name, fields)
+        if unknown:
+            raise ValueError(f'{self.name} has no field(s) {", ".join(unknown)}')
+
+    async def normalize(self, entries, parse_dates: bool=True) -> List[Dict[str, Any]]:
+        """Entries normalised according to their field types, see normalize.py"""
+        if not entries:
+            return list()
+        fields = entries.fields if isinstance(entries, Rows) else list(entries[0])
+        return normalize(entries, await self.field_types(*fields), parse_dates=parse_dates)
+
     @classmethod
     async def for_entries_request(cls,
                                   requester,
@@ -170,7 +332,29 @@ class ModelBase(UserDict):
                           *fields,
                           ids: Optional[List]=None,
                           filters: Optional[List]=None,
+                          use_cache: bool=False,
+                          local: bool=False,
+                          as_records: bool=False,
+                          normalized: bool=False,
+                          parse_dates: bool=True,
                           **kwargs):
+        """
+        Fetch entries by ids and/or filters.
+
+        With normalized, many2one fields are split into id and name, False becomes None and dates are parsed
+        unless parse_dates is False (see normalize.py). With as_records, entries are returned as compact records (see records.py).
+
+        With use_cache, filters are first resolved to ids (and their __last_update) and only the entries
+        missing from, or outdated in, the Requester's record cache are read. Cached and fetched entries are
+        merged in search order. Entries requested by ids are served from cache without any round-trip,
+        unless they were loaded from the persistent cache and still need their version checked.
+
+        With local, filters are evaluated against cached entries instead of searched (see evaluate.py) when
+        the cache provably holds every matching entry: the filters restrict "id" to a set of ids, or imply the
+        filters of an earlier use_cache/local search (or SyncEngine snapshot) within the cache's ttl. Only the
+        candidates missing from the cache are read. Filters on "active" and calls with a context are always
+        searched, since odoo's implicit active_test depends on them. Otherwise local behaves like use_cache.
+        """
         if ids is None and filters is None:
             raise ValueError(f'"ids" and "filters" cannot both be None')
 
@@ -179,25 +363,296 @@ class ModelBase(UserDict):
                             f"{fields}. both filter and ids are empty")
             return list()
 
-        action = 'search_read'
-        args = list()
-        if ids:
-            args.append(ids)
-            action = 'read'
-
-        if filters:
-            args.append(Filter.make_filters(filters))
-
-        if fields is None:
-            fields = self.permitted_fields
-        elif not fields:
+        if not fields:
             fields = self.default_fields
 
         kwargs['fields'] = fields
-        res = await self.execute_kw(action, args, **kwargs)
+
+        if ids and filters:
+            # "read" does not take a domain. restrict the search to the ids instead
+            filters = [*Filter.make_filters(filters), ['id', 'in', list(ids)]]
+            ids = None
+
+        if local and filters:
+            fetch = self._get_local(Filter.make_filters(filters), **kwargs)
+        elif use_cache or local:
+            fetch = self._get_cached(list(ids) if ids else None, Filter.make_filters(filters or []), **kwargs)
+        elif ids:
+            fetch = self._read_chunked(list(ids), **kwargs)
+        else:
+            fetch = self._search_chunked(Filter.make_filters(filters), **kwargs)
+
+        if normalized:
+            # the field types are fetched alongside the entries
+            res, types = await asyncio.gather(fetch, self.field_types(*fields))
+            res = normalize(res, types, parse_dates=parse_dates)
+        else:
+            res = await fetch
         logging.debug(f'Fetched {len(res)} {self.__class__.__name__} entries')
+        if as_records:
+            return to_records(self.name, res)
         return res
 
+    async def aggregate(self,
+                        groupby: Sequence[str],
+                        fields: Sequence[str]=(),
+                        filters: Optional[List]=None,
+                        lazy: bool=True,
+                        local: bool=False) -> List[Dict[str, Any]]:
+        """
+        Count the entries matching filters (default: all) per group of the groupby fields and sum their
+        numeric fields, on the server with read_group. With lazy only the first groupby field is grouped by,
+        as in odoo. Every group has its count in "__count" (odoo's lazy "<field>_count" is renamed) and
+        its "__domain".
+
+        With local, or if the server has no read_group for the model, the groups are computed client-side (see aggregate.py) from the
+        entries, which are served by the record cache where it covers the filters (see get_entries' local).
+        """
+        groupby = [groupby] if isinstance(groupby, str) else list(groupby)
+        if not groupby:
+            raise ValueError('"groupby" cannot be empty')
+        fields = list(fields)
+        domain = Filter.make_filters(filters or [])
+
+        if not local:
+            try:
+                groups = await self.req.execute_kw(self.name, 'read_group', [domain, [*groupby, *fields], groupby],
+                                                   lazy=lazy)
+            except Fault as exc:
+                # any other fault (access, a bad domain or field) would fail client-side alike
+                if not NO_READ_GROUP.search(exc.faultString):
+                    raise
+                logging.warning(f'read_group is not available on {self.name}. Grouping client-side')
+            else:
+                count = f'{groupby[0]}_count'
+                for group in groups:
+                    if count in group:
+                        group['__count'] = group.pop(count)
+                return groups
+
+        read_fields = list(dict.fromkeys([*groupby, *fields]))
+        types, entries = await asyncio.gather(self.field_types(*read_fields),
+                                              self._get_local(domain, fields=read_fields))
+        return group_entries(entries, groupby, fields, types, lazy=lazy, domain=domain)
+
+    async def get_frame(self,
+                        *fields,
+                        ids: Optional[List]=None,
+                        filters: Optional[List]=None,
+                        backend: str='pandas',
+                        **kwargs):
+        """
+        Entries as a pandas DataFrame indexed by id (backend="arrow" for a pyarrow Table), built column-wise
+        from the decoded rows without a dict per entry. See frames.py for the conversion of each field type.
+        """
+        if ids is None and filters is None:
+            raise ValueError(f'"ids" and "filters" cannot both be None')
+        try:
+            build = frames.BACKENDS[backend]
+        except KeyError:
+            raise ValueError(f'Unknown backend "{backend}". Choose one of {", ".join(frames.BACKENDS)}') from None
+
+        fields = list(fields or self.default_fields)
+        kwargs.update(fields=fields, rows=True)
+        types, rows = await asyncio.gather(self.field_types(*fields), self._get_rows(ids, filters, **kwargs))
+        return build(rows, types)
+
+    async def _get_rows(self, ids, filters, **kwargs):
+        if ids and filters:
+            filters = [*Filter.make_filters(filters), ['id', 'in', list(ids)]]
+            ids = None
+        if ids:
+            return await self._read_chunked(list(ids), **kwargs)
+        if ids is not None and not filters:
+            return merge_rows([], ('id', *kwargs['fields']))
+        return await self._search_chunked(Filter.make_filters(filters), **kwargs)
+
+    async def iter_entries(self,
+                           *fields,
+                           ids: Optional[List]=None,
+                           filters: Optional[List]=None,
+                           page_size: int=500,
+                           order: str='id',
+                           batches: bool=False,
+                           **kwargs):
+        """
+        Stream entries page by page instead of materializing the whole result.
+
+        Pages are fetched with offset/limit (or chunks of ids) and the next page is requested while the
+        caller consumes the current one. Yields single entries, or whole pages if batches is True.
+        """
+        if not fields:
+            fields = self.default_fields
+        kwargs['fields'] = fields
+
+        if ids is not None:
+            ids = list(ids)
+
+            async def fetch(offset):
+                return await self.execute_kw('read', [ids[offset:offset + page_size]], **kwargs)
+        else:
+            domain = Filter.make_filters(filters or [])
+
+            async def fetch(offset):
+                return await self.execute_kw('search_read', [domain],
+                                             offset=offset, limit=page_size, order=order, **kwargs)
+
+        offset = 0
+        pending = asyncio.ensure_future(fetch(offset))
+        try:
+            while pending is not None:
+                page = await pending
+                offset += page_size
+                if offset >= len(ids) if ids is not None else len(page) < page_size:
+                    pending = None
+                else:
+                    pending = asyncio.ensure_future(fetch(offset))
+
+                if batches:
+                    yield page
+                else:
+                    for entry in page:
+                        yield entry
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+    async def stream_entries(self,
+                             *fields,
+                             ids: Optional[List]=None,
+                             filters: Optional[List]=None,
+                             **kwargs):
+        """
+        Yield entries of a single read/search_read as they are decoded from the response, overlapping the
+        transfer with decoding and never holding the whole raw response and result at the same time.
+        """
+        if not fields:
+            fields = self.default_fields
+        kwargs['fields'] = fields
+
+        if ids:
+            stream = self.req.stream_kw(self.name, 'read', [list(ids)], **kwargs)
+        else:
+            stream = self.req.stream_kw(self.name, 'search_read', [Filter.make_filters(filters or [])], **kwargs)
+
+        async for entry in stream:
+            yield entry
+
+    async def _read_chunked(self, ids, **kwargs):
+        results = await asyncio.gather(*(self.execute_kw('read', [chunk], **kwargs)
+                                         for chunk in chunks(ids, self.read_chunk_size)))
+        if kwargs.get('rows'):
+            return merge_rows(results, ('id', *kwargs['fields']))
+        return [entry for res in results for entry in res]
+
+    def _splittable_term(self, domain, kwargs):
+        """Find the largest "in" operand that can be split over several search_read calls"""
+        if any(k in kwargs for k in ('limit', 'offset', 'order')):
+            # ordering and paging are applied per call and would not add up
+            return None
+
+        best = None
+        for i, term in enumerate(domain):
+            if not isinstance(term, (list, tuple)) or len(term) != 3:
+                # explicit domain operators. splitting is only valid for an implicit AND
+                return None
+
+            field, op, value = term
+            if op != 'in' or not isinstance(value, (list, tuple)) or len(value) <= self.filter_chunk_size:
+                continue
+            if best is None or len(value) > len(domain[best][2]):
+                best = i
+        return best
+
+    async def _search_chunked(self, domain, action='search_read', **kwargs):
+        if is_false(domain):
+            logging.debug(f'{self.name}: domain {domain} matches nothing. Not searching')
+            if kwargs.get('rows'):
+                return merge_rows([], ('id', *kwargs['fields']))
+            return list()
+
+        i = self._splittable_term(domain, kwargs)
+        if i is None:
+            res = await self.execute_kw(action, [domain], **kwargs)
+            if kwargs.get('rows'):
+                return merge_rows([res], ('id', *kwargs['fields']))
+            return res
+
+        field, op, values = domain[i]
+        domains = [[*domain[:i], [field, op, list(chunk)], *domain[i + 1:]]
+                   for chunk in chunks(values, self.filter_chunk_size)]
+        results = await asyncio.gather(*(self.execute_kw(action, [d], **kwargs) for d in domains))
+        if kwargs.get('rows'):
+            return merge_rows(results, ('id', *kwargs['fields']))
+        return merge_unique(results)
+
+    async def _get_cached(self, ids, domain, **kwargs):
+        cache = self.req.cache
+        if ids is None:
+            # fetching the version along with the ids lets the cache drop entries changed on the server
+            kwargs_ = dict(kwargs, fields=['__last_update'])
+            versions = await self._search_chunked(domain, **kwargs_)
+            cache.validate(self.name, dict((v['id'], v['__last_update']) for v in versions))
+            ids = [v['id'] for v in versions]
+            if not any(k in kwargs for k in ('limit', 'offset', 'context')):
+                cache.cover(self.name, domain_key(domain), ids)
+        else:
+            # entries warm-started from disk are re-read only if their version changed
+            unverified = cache.unverified(self.name, ids)
+            if unverified:
+                versions = await self._read_chunked(unverified, **dict(_read_kwargs(kwargs), fields=['__last_update']))
+                versions = dict((v['id'], v['__last_update']) for v in versions)
+                cache.validate(self.name, versions)
+                cache.invalidate(self.name, set(unverified).difference(versions))
+
+        entries = await self._read_through(ids, **kwargs)
+        # ids read without a result were deleted on the server
+        return [entries[i] for i in ids if entries[i] is not None]
+
+    async def _read_through(self, ids, **kwargs) -> Dict[int, Optional[Dict[str, Any]]]:
+        """
+        id -> entry with fields, from the record cache or read (and cached). Entries read are handed out as
+        read rather than looked up again, since putting them may evict them (or the hits) right away
+        """
+        fields = kwargs['fields']
+        cache = self.req.cache
+        entries = dict((id, cache.get(self.name, id, fields)) for id in ids)
+        missing = [id for id, entry in entries.items() if entry is None]
+        if missing:
+            read_kwargs = dict(_read_kwargs(kwargs), fields=[*fields, '__last_update'])
+            read = await self._read_chunked(missing, **read_kwargs)
+            cache.put(self.name, read)
+            entries.update((entry['id'], dict((f, entry[f]) for f in ('id', *fields) if f in entry))
+                           for entry in read)
+        logging.debug(f'{self.name}: {len(entries) - len(missing)} of {len(entries)} entries served from cache')
+        return entries
+
+    async def _get_local(self, domain, **kwargs):
+        key = domain_key(domain)
+        cache = self.req.cache
+        ids = None
+        # scopes are searched without a context, so they hold active records only (odoo's implicit
+        # active_test). a domain on "active" or a context (e.g. active_test=False) may match others
+        if not any(k in kwargs for k in ('limit', 'offset', 'order', 'context')) and 'active' not in fields_of(key):
+            ids = candidates(key, cache.scopes(self.name))
+        if ids is None or cache.unverified(self.name, ids):
+            return await self._get_cached(None, domain, **kwargs)
+        if 'active' in await self.field_types('active'):
+            # the ids of an "id" term may be archived, which the search would skip
+            key = domain_key([*domain, ['active', '=', True]])
+
+        fields = kwargs['fields']
+        needed = list(dict.fromkeys([*fields, *(f for f in fields_of(key) if f != 'id')]))
+        entries = await self._read_through(ids, **dict(kwargs, fields=needed))
+        entries = [entries[i] for i in ids if entries[i] is not None]
+        try:
+            entries = filter_entries(entries, key)
+        except NotEvaluable as exc:
+            logging.debug(f'{self.name}: {exc}. Searching instead')
+            return await self._get_cached(None, domain, **kwargs)
+        logging.debug(f'{self.name}: evaluated filters on {len(ids)} cached entries')
+        return [dict((f, entry[f]) for f in ('id', *fields) if f in entry) for entry in entries]
+
     async def set_with_filter(self, filters):
         self.ids = [
             d['id'] for d in (await self.get_entries('id', filters=filters))
@@ -218,10 +673,20 @@ class ModelBase(UserDict):
         pass
 
 
+def model_for(requester, model_name) -> ModelBase:
+    """An instance of the ModelBase subclass for model_name, or a plain ModelBase if there is none"""
+    classes = [ModelBase]
+    while classes:
+        cls = classes.pop()
+        if cls.model_name == model_name:
+            return cls(requester)
+        classes.extend(cls.__subclasses__())
+    return ModelBase(requester, model_name=model_name)
+
+
 def set_name(name):
     def __init__(self, requester):
-        self.req = requester
-        self.name = name
+        ModelBase.__init__(self, requester, model_name=name)
 
     def wrapper(klass):
         setattr(klass, '__init__', __init__)
@@ -234,10 +699,7 @@ class ModelOverview(ModelBase):
     model_name = 'ir.model'
 
     async def get_model_fields(self, model_name):
-        return await self.req.execute_kw(
-            model_name,
-            'fields_get', [],
-            attributes=['string', 'help', 'type'])
+        return await self.req.schema.fields(model_name)
 
     async def models_info(self):
         return await self.execute_kw(
@@ -246,40 +708,6 @@ class ModelOverview(ModelBase):
 
 class Event(ModelBase):
     model_name = 'event.event'
-    permitted_fields = [
-        'badge_innerleft', 'use_seats_min', 'ask_phone', 'country_id', 'date_end',
-        'write_uid', 'date_end_located', 'ask_name', 'require_schoolclass', 'email_confirmation_id',
-        'email_cancellation_id', 'date_publish_end', 'message_summary', 'max_age', 'registration_enable_terms',
-        'display_name', 'cabin_rent', 'seats_min', 'show_tracks', 'ask_gender', 'use_event_number',
-        'company_id', 'dynaview_updating', 'event_ticket_ids', 'menu_id', 'allowed_track_tag_ids',
-        'price_leaders', 'allow_cancellation', 'badge_back', 'organization_type_id', 'twitter_hashtag',
-        'seats_max', 'refresh_dynaview', 'export_code', 'remote_url', 'ask_schoolclass', 'require_ckr_check',
-        'use_leaderprice', 'seats_used', 'name', 'use_allow_leaderprice', 'date_registration_begin',
-        'allow_registration_editing', 'model_object_field', 'use_teaser', 'require_permission_photo',
-        'require_handicap', 'use_moveto', 'website_message_ids', 'notes', 'message_follower_ids', 'create_date',
-        'event_moveto_ids', 'use_terms', 'query', 'duration', 'use_location', 'seats_waitinglist', 'use_export_codes',
-        'attachment_ids', 'organization_registration_terms', 'ask_address', 'state', 'field_data', 'use_cabin_rent',
-        'show_menu', 'ask_organization', 'model_id', 'track_ids', 'use_registration_editing',
-        'is_open_for_public_registrations', 'date_begin', 'min_age', 'copyvalue', 'seats_manual', 'count_tracks',
-        'course_certificate_description', 'use_sub_organization_tags', 'organizer_id', 'message_unread',
-        'is_web_public', 'use_allow_all_users_to_register', 'ask_permission_photo', 'require_phone', 'address_id',
-        'require_diseases', 'event_period_ids', 'message_last_post', 'function_ids', 'price', 'require_name',
-        'sub_object', 'create_uid', 'registration_ids', 'message_is_follower', '__last_update', 'tag_ids',
-        'date_begin_located', 'ask_scout_name', 'date_publish_begin', 'allow_all_users_to_register', 'event_code',
-        'null_value', 'require_gender', 'ask_email', 'type', 'date_tz', 'blog_id', 'count_registrations',
-        'use_duration', 'ask_mobile', 'use_team', 'organization_id', 'use_age_restrictions', 'teaser',
-        'seats_max_nocompute', 'ask_handicap', 'require_birthdate', 'registration_terms', 'use_lock_event',
-        'last_cancellation', 'locked', 'use_cancellation', 'seats_available', 'require_other_info', 'ask_birthdate',
-        'tracks_tag_ids', 'require_mobile', 'sub_model_object_field', 'website_meta_keywords', 'timezone_of_event',
-        'use_publication_dates', 'email_registration_id', 'require_scout_name', 'date_registration_end',
-        'is_subscribed', 'sponsor_ids', 'show_track_proposal', 'last_registration_editing', 'sub_organization_ids',
-        'use_invoicepayment', 'id', 'is_accounting_enabled', 'seats_reserved', 'require_organization', 'remote_id',
-        'resp_partner_id', 'message_ids', 'enable_track', 'use_allow_invoicepayment', 'website_meta_title',
-        'ask_other_info', 'xml_tree_view', 'website_published', 'website_url', 'remote_update', 'description',
-        'require_login', 'ask_diseases', 'dynaview_id', 'show_blog', 'registration_non_draft_ids', 'write_date',
-        'require_address', 'can_edit', 'event_question_ids', 'user_id', 'website_meta_description',
-        'use_course_certificate', 'badge_innerright', 'seats_unconfirmed', 'reply_to', 'use_multi_periods',
-        'require_email']
 
     registration_ids: List[int]
     name: str
@@ -287,54 +715,6 @@ class Event(ModelBase):
 
 class Member(ModelBase):
     model_name = 'member.member'
-    permitted_fields = [
-        '__last_update', 'active', 'active_function_ids',
-        'active_membership_ids', 'active_profile_ids', 'address_co', 'age',
-        'bank_ids', 'birthdate', 'birthdate_short', 'bm_id', 'bm_sso_id',
-        'bmhash', 'bmref', 'calendar_last_notif_ack', 'category_id',
-        'child_ids', 'city', 'ckr_check_ids', 'color', 'comment',
-        'commercial_partner_id', 'company_id', 'complete_address',
-        'contact_address', 'context_age', 'contract_ids', 'country_id',
-        'create_date', 'create_uid', 'credit', 'credit_limit', 'customer',
-        'date', 'date_localization', 'debit', 'debit_limit', 'display_name',
-        'ean13', 'edit_birthdate', 'edit_member_number', 'edit_name',
-        'edit_restricted_fields', 'email', 'employee',
-        'event_registration_ids', 'externalid', 'fax', 'firstname', 'function',
-        'function_ids', 'functions_text', 'gender', 'has_image', 'id', 'image',
-        'image_medium', 'image_small', 'import_status', 'is_active_leader',
-        'is_company', 'lang', 'last_contact_confirm', 'last_import',
-        'last_reconciliation_date', 'lastname', 'leader_function_ids',
-        'locking_ckr_check_ids', 'locks_name_ids', 'meeting_count',
-        'meeting_ids', 'member_id', 'member_number', 'membership_ids',
-        'message_follower_ids', 'message_ids', 'message_is_follower',
-        'message_last_post', 'message_summary', 'message_unread', 'mobile',
-        'mobile_clean', 'municipality_id', 'name', 'notify_email',
-        'opportunity_count', 'opportunity_ids', 'opt_out', 'organization_id',
-        'parent_id', 'parent_name', 'parish_id', 'partner_id',
-        'partner_latitude', 'partner_longitude', 'payer_for_profile_ids',
-        'phone', 'phone_combo', 'phonecall_count', 'phonecall_ids',
-        'profile_ids', 'property_account_payable', 'property_account_position',
-        'property_account_receivable', 'property_payment_term',
-        'property_product_pricelist', 'property_stock_customer',
-        'property_stock_supplier', 'property_supplier_payment_term', 'ref',
-        'ref_companies', 'registered', 'relation_all_ids',
-        'relation_all_member_ids', 'relation_count', 'relation_ids',
-        'relation_partner_list', 'relation_primary_member_ids',
-        'sale_order_count', 'school', 'school_class_letter',
-        'school_class_number', 'school_start_year', 'search_relation_date',
-        'search_relation_id', 'search_relation_partner_category_id',
-        'search_relation_partner_id', 'section_id', 'self',
-        'self_relation_partner_list', 'signup_expiration', 'signup_token',
-        'signup_type', 'signup_url', 'signup_valid', 'speaker', 'state_id',
-        'street', 'street2', 'street_floor', 'street_letter', 'street_name',
-        'street_number', 'street_placement', 'supplier', 'task_count',
-        'task_ids', 'title', 'type', 'tz', 'tz_offset', 'use_parent_address',
-        'user_full_ids', 'user_id', 'user_ids', 'user_read_ids', 'vat',
-        'vat_subjected', 'website', 'website_description',
-        'website_meta_description', 'website_meta_keywords',
-        'website_meta_title', 'website_published', 'website_short_description',
-        'write_date', 'write_uid', 'zip'
-    ]
     default_fields = [
         'primary_membership_organization_id',
         'birthdate',
@@ -347,71 +727,6 @@ class Member(ModelBase):
 
 class Profile(ModelBase):
     model_name = 'member.profile'
-    permitted_fields = [
-        '__last_update', 'account_invoice_line_ids', 'active',
-        'active_function_ids', 'active_functions_in_profile',
-        'active_membership_ids', 'active_memberships_in_profile',
-        'active_profile_ids', 'address_co', 'age', 'all_functions_in_profile',
-        'all_memberships_in_profile', 'bank_ids', 'birthdate',
-        'birthdate_short', 'bm_id', 'bm_sso_id', 'bmhash', 'bmref',
-        'calendar_last_notif_ack', 'can_delete', 'can_edit', 'can_expense',
-        'can_full_all', 'category_id', 'child_ids', 'city', 'ckr_check_ids',
-        'color', 'comment', 'commercial_partner_id', 'company_id',
-        'complete_address', 'contact_address', 'context_age', 'contract_ids',
-        'country_id', 'create_date', 'create_uid', 'credit', 'credit_limit',
-        'customer', 'date', 'date_localization', 'debit', 'debit_limit',
-        'diseases', 'display_name', 'ean13', 'edit_birthdate',
-        'edit_member_number', 'edit_name', 'edit_organization_id',
-        'edit_restricted_fields', 'email', 'employee',
-        'event_registration_ids', 'externalid', 'fax', 'firstname', 'function',
-        'function_ids', 'functions_text', 'gender', 'handicap', 'has_image',
-        'help_info', 'id', 'image', 'image_medium', 'image_small',
-        'import_status', 'is_active_leader', 'is_company', 'lang',
-        'last_contact_confirm', 'last_import', 'last_reconciliation_date',
-        'lastname', 'leader_function_ids', 'locking_ckr_check_ids',
-        'locks_name_ids', 'meeting_count', 'meeting_ids', 'member_id',
-        'member_number', 'membership_ids', 'message_follower_ids',
-        'message_ids', 'message_is_follower', 'message_last_post',
-        'message_summary', 'message_unread', 'mobile', 'mobile_clean',
-        'municipality_id', 'name', 'notify_email', 'opportunity_count',
-        'opportunity_ids', 'opt_out', 'organization_id',
-        'organization_structure_parent_id', 'organization_type_id',
-        'other_info', 'parent_id', 'parent_name', 'parish_id', 'partner_id',
-        'partner_latitude', 'partner_longitude', 'partner_payer_id',
-        'payer_for_profile_ids', 'payer_for_profile_this_organization_ids',
-        'pbmhash', 'pbmref', 'permission_photo', 'phone', 'phone_combo',
-        'phonecall_count', 'phonecall_ids', 'plast_import',
-        'preliminary_organization_id', 'primary_membership_organization_id',
-        'profile_ids', 'promotion_ids', 'property_account_payable',
-        'property_account_position', 'property_account_receivable',
-        'property_payment_term', 'property_product_pricelist',
-        'property_stock_customer', 'property_stock_supplier',
-        'property_supplier_payment_term', 'ref', 'ref_companies', 'registered',
-        'relation_all_ids', 'relation_all_member_ids', 'relation_count',
-        'relation_ids', 'relation_partner_list', 'relation_primary_member_ids',
-        'relative_for_profile_id', 'relative_member_id', 'relative_type_id',
-        'sale_order_count', 'school', 'school_class_letter',
-        'school_class_number', 'school_start_year', 'scout_name',
-        'search_relation_date', 'search_relation_id',
-        'search_relation_partner_category_id', 'search_relation_partner_id',
-        'section_id', 'self', 'self_relation_partner_list',
-        'signup_expiration', 'signup_token', 'signup_type', 'signup_url',
-        'signup_valid', 'speaker', 'state', 'state_id', 'stored_partner_id',
-        'street', 'street2', 'street_floor', 'street_letter', 'street_name',
-        'street_number', 'street_placement', 'subscription_card',
-        'subscription_fee_date_end', 'subscription_fee_date_start',
-        'subscription_fee_has_draft_lines', 'subscription_fee_receivable',
-        'subscription_last_charged_end_date', 'subscription_last_warning_date',
-        'subscription_product_id', 'subscription_transaction', 'supplier',
-        'task_count', 'task_ids', 'title', 'type', 'tz', 'tz_offset',
-        'use_parent_address', 'user_full_ids', 'user_id', 'user_ids',
-        'user_read_ids', 'vat', 'vat_subjected', 'waitinglist_date', 'website',
-        'website_description', 'website_message_ids',
-        'website_meta_description', 'website_meta_keywords',
-        'website_meta_title', 'website_published', 'website_short_description',
-        'write_date', 'write_uid', 'zip'
-    ]
-
     default_fields = [
         'primary_membership_organization_id',
         'birthdate',
@@ -428,6 +743,7 @@ class Membership(ModelBase):
 
 class Registration(ModelBase):
     model_name = 'event.registration'
+    indexed_fields = ('member_id', 'event_id')
 
 
 class Question(ModelBase):
@@ -436,6 +752,7 @@ class Question(ModelBase):
 
 class Answer(ModelBase):
     model_name = 'event.question.response'
+    indexed_fields = ('event_registration_id',)
     default_fields = [
         'event_registration_id',
         'event_question_id',
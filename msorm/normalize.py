@@ -0,0 +1,97 @@
+"""
+Column-wise normalisation of entries, driven by the odoo field types (as from fields_get).
+
+Each field of a result set is converted in one pass over its column:
+
+- many2one [id, name] pairs become two columns, "<field>" holding the id and "<field>_name"
+- False, odoo's null for every type but boolean, becomes None
+- date/datetime strings become date/datetime objects (datetimes in UTC)
+
+so consumers can use entry['member_id'] and entry['member_id_name'] without checking for False.
+"""
+from datetime import date, datetime, timezone
+from functools import partial
+from typing import Any, Callable, Dict, List, Mapping, Sequence, Tuple
+
+from .xmlparse import Rows
+
+# odoo field type -> column kind
+KINDS = {
+    'many2one': 'many2one',
+    'one2many': 'list',
+    'many2many': 'list',
+    'date': 'date',
+    'datetime': 'datetime',
+    'boolean': 'bool',
+    'integer': 'int',
+    'float': 'float',
+    'monetary': 'float',
+    'char': 'str',
+    'text': 'str',
+    'html': 'str',
+    'selection': 'str',
+}
+
+
+def kind_of(field: str, types: Mapping[str, str]):
+    # odoo 8 does not list "id" in fields_get
+    return KINDS.get(types.get(field, 'integer' if field == 'id' else None))
+
+
+def nullify(values: Sequence[Any]) -> List[Any]:
+    return [None if v is False else v for v in values]
+
+
+def split_many2one(values: Sequence[Any]) -> Tuple[List[Any], List[Any]]:
+    ids = [v[0] if v else None for v in values]
+    names = [v[1] if v else None for v in values]
+    return ids, names
+
+
+def _utc_datetime(value: str) -> datetime:
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+
+
+def python_column(kind, values, parse_dates=True) -> List[Any]:
+    if kind in ('bool', 'list'):
+        return list(values)
+    values = nullify(values)
+    if parse_dates and kind in ('date', 'datetime'):
+        parse = date.fromisoformat if kind == 'date' else _utc_datetime
+        return [None if v is None else parse(v) for v in values]
+    return values
+
+
+def columns_of(entries) -> Dict[str, Sequence[Any]]:
+    """Rows or a list of dicts sharing the same keys as field -> column"""
+    if isinstance(entries, Rows):
+        if not entries:
+            return dict((field, ()) for field in entries.fields)
+        return dict(zip(entries.fields, zip(*entries)))
+    if not entries:
+        return dict()
+    return dict((field, [entry[field] for entry in entries]) for field in entries[0])
+
+
+def normalize_columns(columns: Mapping[str, Sequence[Any]],
+                      types: Mapping[str, str],
+                      make_column: Callable[[str, Sequence[Any]], Any]=python_column) -> Dict[str, Any]:
+    normalized = dict()
+    for field, values in columns.items():
+        kind = kind_of(field, types)
+        if kind == 'many2one':
+            ids, names = split_many2one(values)
+            normalized[field] = make_column('int', ids)
+            normalized[f'{field}_name'] = make_column('str', names)
+        else:
+            normalized[field] = make_column(kind, values)
+    return normalized
+
+
+def normalize(entries, types: Mapping[str, str], parse_dates: bool=True) -> List[Dict[str, Any]]:
+    """Normalised copies of entries (dicts or Rows)"""
+    columns = normalize_columns(columns_of(entries), types, partial(python_column, parse_dates=parse_dates))
+    if not columns:
+        return list()
+    fields = tuple(columns)
+    return [dict(zip(fields, values)) for values in zip(*columns.values())]
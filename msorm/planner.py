@@ -0,0 +1,157 @@
+import asyncio
+import json
+import logging
+import xmlrpc.client
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple
+
+from .scheduler import Priority
+from .xmlparse import Rows
+
+# methods without side effects, whose concurrent identical calls may share one result
+READ_METHODS = frozenset(('read', 'search', 'search_read', 'search_count', 'fields_get', 'read_group', 'name_get'))
+
+
+class PlannerStats:
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0     # calls answered by an identical call already in flight
+        self.merged = 0     # read calls answered by a merged read
+        self.reads = 0      # merged reads sent
+
+    def __repr__(self):
+        return f'<PlannerStats calls={self.calls} shared={self.shared} merged={self.merged} reads={self.reads}>'
+
+
+class _Read(NamedTuple):
+    ids: List[int]
+    fields: List[str]
+    priority: Priority
+    future: asyncio.Future
+
+
+def _copy(result):
+    """A copy of a result that a caller may sort or update without affecting other callers"""
+    if isinstance(result, Rows):
+        # rows are tuples and need no copy, but the fields must come along
+        return Rows(result.fields, result)
+    if isinstance(result, list):
+        return [dict(entry) if isinstance(entry, dict) else entry for entry in result]
+    if isinstance(result, dict):
+        return dict(result)
+    return result
+
+
+class Planner:
+    """
+    Coalesces concurrent execute_kw calls before they are scheduled.
+
+    Identical calls of side effect free methods that are in flight at the same time share one call
+    (singleflight). read calls on the same model issued in the same loop iteration are merged into reads
+    of the union of their ids and fields (at most max_ids ids each), and every caller gets back its own
+    ids and fields. If a merged read faults, e.g. because one caller asked for a forbidden field, the
+    reads are retried individually.
+    """
+    # as large as ModelBase.read_chunk_size, so the chunks of one large read are not merged back together
+    def __init__(self, execute: Callable[..., Awaitable[Any]], max_ids: int=200):
+        self.execute = execute
+        self.max_ids = max_ids
+        self.stats = PlannerStats()
+        self._inflight: Dict[str, asyncio.Future] = dict()
+        self._reads: Dict[str, List[_Read]] = dict()
+
+    async def call(self, model, method, *args, priority: Priority=Priority.NORMAL, rows: bool=False, **kwargs):
+        self.stats.calls += 1
+        if method not in READ_METHODS:
+            return await self.execute(model, method, *args, priority=priority, rows=rows, **kwargs)
+
+        if method == 'read' and not rows and self._mergeable(args, kwargs):
+            return await self._read(model, list(args[0][0]), list(kwargs['fields']), priority)
+
+        try:
+            key = json.dumps([model, method, args, kwargs, rows], sort_keys=True)
+        except TypeError:
+            return await self.execute(model, method, *args, priority=priority, rows=rows, **kwargs)
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats.shared += 1
+            return _copy(await asyncio.shield(future))
+
+        future = asyncio.ensure_future(self.execute(model, method, *args, priority=priority, rows=rows, **kwargs))
+        self._inflight[key] = future
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    @staticmethod
+    def _mergeable(args, kwargs):
+        # args is ([ids],). a read without explicit fields returns every field and cannot be split back up
+        return len(args) == 1 and len(args[0]) == 1 and set(kwargs) == {'fields'} and kwargs['fields']
+
+    async def _read(self, model, ids, fields, priority):
+        loop = asyncio.get_event_loop()
+        if model not in self._reads:
+            self._reads[model] = list()
+            loop.call_soon(self._flush, model)
+        future = loop.create_future()
+        self._reads[model].append(_Read(ids, fields, priority, future))
+        return await future
+
+    def _flush(self, model):
+        reads = self._reads.pop(model)
+        groups: List[List[_Read]] = list()
+        size = self.max_ids
+        for read in reads:
+            if size + len(read.ids) > self.max_ids:
+                groups.append(list())
+                size = 0
+            groups[-1].append(read)
+            size += len(read.ids)
+
+        for group in groups:
+            asyncio.ensure_future(self._dispatch(model, group))
+
+    async def _single(self, model, read: _Read):
+        try:
+            result = await self.execute(model, 'read', [read.ids], priority=read.priority, rows=False,
+                                        fields=read.fields)
+        except Exception as exc:
+            if not read.future.done():
+                read.future.set_exception(exc)
+        else:
+            if not read.future.done():
+                read.future.set_result(result)
+
+    async def _dispatch(self, model, reads: List[_Read]):
+        reads = [read for read in reads if not read.future.done()]
+        if len(reads) <= 1:
+            await asyncio.gather(*(self._single(model, read) for read in reads))
+            return
+
+        ids = list(dict.fromkeys(id for read in reads for id in read.ids))
+        fields = list(dict.fromkeys(field for read in reads for field in read.fields))
+        self.stats.reads += 1
+        try:
+            entries = await self.execute(model, 'read', [ids], priority=min(read.priority for read in reads),
+                                         rows=False, fields=fields)
+            by_id = dict((entry['id'], entry) for entry in entries)
+        except xmlrpc.client.Fault as exc:
+            logging.debug(f'Merged read of {len(reads)} calls on {model} failed ({exc.faultString.strip()[:80]}). '
+                          f'Reading individually')
+            await asyncio.gather(*(self._single(model, read) for read in reads))
+            return
+        except Exception as exc:
+            for read in reads:
+                if not read.future.done():
+                    read.future.set_exception(exc)
+            return
+
+        for read in reads:
+            if read.future.done():
+                continue
+            self.stats.merged += 1
+            wanted = [field for field in read.fields if field != 'id']
+            try:
+                read.future.set_result([dict(id=id, **dict((field, by_id[id][field]) for field in wanted))
+                                        for id in read.ids if id in by_id])
+            except Exception as exc:
+                read.future.set_exception(exc)
@@ -0,0 +1,102 @@
+"""
+Compact record objects for fetched entries.
+
+A dict per entry carries its own hash table with a pointer per key. A record class is generated once
+per (model, field set) with one __slots__ member per field, so an entry costs a fixed size object
+with one pointer per value. Records support attribute access and read-only mapping access
+(entry['name'], .get(), .items(), == dict). Fields named like a Record attribute (e.g. "values" or "get")
+are only accessible as items.
+"""
+import operator
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, List, Tuple, Type
+
+_classes: Dict[Tuple[str, Tuple[str, ...]], Type['Record']] = dict()
+
+
+class Record(Mapping):
+    __slots__ = ()
+    _model: str = None
+    _fields: Tuple[str, ...] = ()
+    _slots: Tuple[str, ...] = ()
+    _index: Dict[str, str] = dict()
+
+    def __init__(self, *values):
+        if len(values) != len(self._fields):
+            raise TypeError(f'{self.__class__.__name__} takes {len(self._fields)} values, got {len(values)}')
+        for slot, value in zip(self._slots, values):
+            object.__setattr__(self, slot, value)
+
+    @classmethod
+    def from_dict(cls, entry: Dict[str, Any]) -> 'Record':
+        return cls(*cls._getter(entry))
+
+    def __getitem__(self, field):
+        try:
+            return getattr(self, self._index[field])
+        except (KeyError, AttributeError):
+            raise KeyError(field) from None
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __contains__(self, field):
+        return field in self._index
+
+    def __repr__(self):
+        values = ', '.join(f'{field}={self[field]!r}' for field in self._fields)
+        return f'{self.__class__.__name__}({values})'
+
+    def __reduce__(self):
+        return record_from_values, (self._model, self._fields, tuple(self.values()))
+
+    def values(self):
+        return [getattr(self, slot) for slot in self._slots]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(zip(self._fields, self.values()))
+
+
+RESERVED = frozenset(dir(Record))
+
+
+def _slot(field: str) -> str:
+    # fields that would shadow a Record attribute, or be mangled by python (e.g. "__last_update"), are
+    # stored under "_f" + field. slots of other fields never start with an underscore, so this cannot collide
+    if field.startswith('_') or field in RESERVED:
+        return f'_f{field}'
+    return field
+
+
+def record_class(model: str, fields: Iterable[str]) -> Type[Record]:
+    """The record class of model with exactly fields, created on first use"""
+    fields = tuple(fields)
+    key = (model, fields)
+    cls = _classes.get(key)
+    if cls is None:
+        name = ''.join(part.capitalize() for part in model.split('.')) + 'Record'
+        slots = tuple(_slot(field) for field in fields)
+        getter = operator.itemgetter(*fields) if len(fields) > 1 else lambda entry: (entry[fields[0]],)
+        cls = type(name, (Record,), dict(__slots__=slots,
+                                         _model=model,
+                                         _fields=fields,
+                                         _slots=slots,
+                                         _index=dict(zip(fields, slots)),
+                                         _getter=staticmethod(getter)))
+        _classes[key] = cls
+    return cls
+
+
+def record_from_values(model: str, fields: Tuple[str, ...], values: tuple) -> Record:
+    return record_class(model, fields)(*values)
+
+
+def to_records(model: str, entries: List[Dict[str, Any]]) -> List[Record]:
+    """Convert entries that share the same keys (as read/search_read return them) to records"""
+    if not entries:
+        return list()
+    cls = record_class(model, entries[0])
+    return [cls.from_dict(entry) for entry in entries]
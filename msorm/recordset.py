@@ -0,0 +1,165 @@
+"""
+Lazily loaded records that prefetch like odoo's own ORM.
+
+Every RecordSet belongs to a prefetch group: the records it was browsed or traversed together with.
+The first time a field is awaited on any record of the group, the field (plus the model's prefetch
+fields) is read for the whole group in one batched read. Relational fields resolve to RecordSets of
+the target model whose prefetch group holds the targets of the entire group, so walking
+registrations -> member_id -> name costs one read per hop instead of one per record.
+
+    registrations = Registration(req).browse(ids)
+    for registration in registrations:
+        member = await registration.member_id    # one read for all registrations
+        name = await member.name                 # one read for all their members
+"""
+import asyncio
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from .schema import MAGIC_FIELDS
+
+RELATIONAL = ('many2one', 'one2many', 'many2many')
+
+
+def _ids_of(value) -> List[int]:
+    """Ids referenced by a many2one ([id, name] or False) or x2many (list of ids) value"""
+    if not value:
+        return list()
+    if isinstance(value, (list, tuple)) and len(value) == 2 and isinstance(value[1], str):
+        return [value[0]]
+    return list(value)
+
+
+class Prefetch:
+    """ids of one model that are loaded together, and the values loaded for them so far"""
+    def __init__(self, model, ids: Iterable[int], fields: Sequence[str]=()):
+        self.model = model
+        self.ids = list(dict.fromkeys(ids))
+        self.fields = [f for f in fields if f != 'id']
+        self.values: Dict[int, Dict[str, Any]] = defaultdict(dict)
+        self._loads: Dict[str, asyncio.Future] = dict()
+        self._targets: Dict[str, 'Prefetch'] = dict()
+
+    async def load(self, field: str):
+        if field == 'id':
+            return
+        if field not in self._loads:
+            fields = [field, *(f for f in self.fields if f not in self._loads and f != field)]
+            load = asyncio.ensure_future(self._read(fields))
+            for f in fields:
+                self._loads[f] = load
+        await asyncio.shield(self._loads[field])
+
+    async def _read(self, fields: List[str]):
+        try:
+            entries = await self.model.get_entries(*fields, ids=self.ids, use_cache=True)
+        except Exception:
+            # let the next access retry
+            for f in fields:
+                self._loads.pop(f, None)
+            raise
+        for entry in entries:
+            self.values[entry['id']].update(entry)
+
+    def value(self, id: int, field: str):
+        if field == 'id':
+            return id
+        return self.values.get(id, dict()).get(field, False)
+
+    def targets(self, field: str, relation: str) -> 'Prefetch':
+        """The prefetch group of everything field refers to from any record of this group"""
+        if field not in self._targets:
+            model = self.model.related(relation)
+            ids = (id for values in self.values.values() for id in _ids_of(values.get(field)))
+            self._targets[field] = Prefetch(model, ids, model.prefetch_fields or model.default_fields)
+        return self._targets[field]
+
+
+class _Field:
+    """A field of a RecordSet, read when awaited. Unlike a coroutine it may be dropped without awaiting it"""
+    __slots__ = ('records', 'field')
+
+    def __init__(self, records: 'RecordSet', field: str):
+        self.records = records
+        self.field = field
+
+    def __await__(self):
+        return self.records.get(self.field).__await__()
+
+
+class RecordSet:
+    """
+    An ordered set of records of one model. Fields are read by awaiting them: await records.name
+
+    On a single record a field gives its value, on several records a list of values. Relational fields
+    give a RecordSet of the targets (for several records, the union of their targets). Names that are not
+    fields of the model raise AttributeError: on access once the model's schema is held, otherwise on await.
+    """
+    def __init__(self, model, ids: Iterable[int], prefetch: Optional[Prefetch]=None):
+        self.model = model
+        self.ids = list(dict.fromkeys(ids))
+        if prefetch is None:
+            prefetch = Prefetch(model, self.ids, model.prefetch_fields or model.default_fields)
+        self.prefetch = prefetch
+
+    def __repr__(self):
+        return f'{self.model.name}{tuple(self.ids)}'
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __bool__(self):
+        return bool(self.ids)
+
+    def __iter__(self):
+        for id in self.ids:
+            yield RecordSet(self.model, (id,), self.prefetch)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return RecordSet(self.model, self.ids[i], self.prefetch)
+        return RecordSet(self.model, (self.ids[i],), self.prefetch)
+
+    def __eq__(self, other):
+        return isinstance(other, RecordSet) and self.model.name == other.model.name and self.ids == other.ids
+
+    def __hash__(self):
+        return hash((self.model.name, tuple(self.ids)))
+
+    def __getattr__(self, field):
+        if field.startswith('_') and field != '__last_update':
+            raise AttributeError(field)
+        fields = self.model.req.schema.held(self.model.name)
+        if fields is not None:
+            self._check(field, fields)
+        return _Field(self, field)
+
+    def _check(self, field: str, fields: Dict[str, Dict[str, Any]]):
+        if field not in fields and field not in MAGIC_FIELDS:
+            raise AttributeError(f'{self.model.name} has no field {field}')
+
+    @property
+    def id(self):
+        return self.ids[0] if len(self.ids) == 1 else self.ids
+
+    async def get(self, field: str):
+        fields = await self.model.req.schema.fields(self.model.name)
+        self._check(field, fields)
+        await self.prefetch.load(field)
+        values = [self.prefetch.value(id, field) for id in self.ids]
+
+        attrs = fields.get(field, dict())
+        if attrs.get('type') in RELATIONAL:
+            targets = self.prefetch.targets(field, attrs['relation'])
+            return RecordSet(targets.model, (id for value in values for id in _ids_of(value)), targets)
+
+        if len(self.ids) == 1:
+            return values[0]
+        return values
+
+    async def read(self, *fields) -> List[Dict[str, Any]]:
+        """The raw values of fields as one dict per record"""
+        fields = fields or self.prefetch.fields
+        await asyncio.gather(*(self.prefetch.load(field) for field in fields))
+        return [dict(id=id, **dict((f, self.prefetch.value(id, f)) for f in fields if f != 'id'))
+                for id in self.ids]
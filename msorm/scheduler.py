@@ -0,0 +1,82 @@
+import asyncio
+from collections import OrderedDict, deque
+from enum import IntEnum
+from typing import Awaitable, Callable, Hashable
+
+
+class Priority(IntEnum):
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+
+class Scheduler:
+    """
+    Limits the number of requests in flight against the server.
+
+    Waiting requests are queued in one lane per priority. Within a lane each key (the odoo model name)
+    gets its own queue and the queues are served round-robin, so one model with thousands of pending
+    requests cannot starve the others.
+    """
+    def __init__(self, max_in_flight=8):
+        if max_in_flight < 1:
+            raise ValueError(f'max_in_flight must be at least 1, got {max_in_flight}')
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.waiting = 0
+        self._lanes = dict((p, OrderedDict()) for p in Priority)
+
+    def __repr__(self):
+        return f'<Scheduler in_flight={self.in_flight}/{self.max_in_flight} waiting={self.waiting}>'
+
+    async def run(self, key: Hashable, priority: Priority, factory: Callable[[], Awaitable]):
+        await self.acquire(key, priority)
+        try:
+            return await factory()
+        finally:
+            self.release()
+
+    async def acquire(self, key: Hashable, priority: Priority=Priority.NORMAL):
+        if self.in_flight < self.max_in_flight and not self.waiting:
+            self.in_flight += 1
+            return
+
+        fut = asyncio.get_event_loop().create_future()
+        lane = self._lanes[Priority(priority)]
+        lane.setdefault(key, deque()).append(fut)
+        self.waiting += 1
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # slot was granted right before we got cancelled. hand it on.
+                self.release()
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        while self.in_flight < self.max_in_flight and self.waiting:
+            fut = self._pop_next()
+            if fut.cancelled():
+                continue
+            self.in_flight += 1
+            fut.set_result(None)
+
+    def _pop_next(self) -> asyncio.Future:
+        for priority in Priority:
+            lane = self._lanes[priority]
+            if not lane:
+                continue
+
+            key, queue = next(iter(lane.items()))
+            fut = queue.popleft()
+            if queue:
+                lane.move_to_end(key)
+            else:
+                del lane[key]
+            self.waiting -= 1
+            return fut
+        raise RuntimeError('Scheduler has waiting requests but all lanes are empty')
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import time
+import xmlrpc.client
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .cache import DiskStore, FieldAccess, Schema
+
+# present on every model, even where fields_get does not list them
+MAGIC_FIELDS = ('id', '__last_update', 'display_name')
+
+
+class SchemaRegistry:
+    """
+    fields_get results of the models of one database, shared by every model through the Requester.
+
+    A schema is refreshed when it is older than check_every seconds and the write_date of the model's
+    ir.model record has changed since it was fetched. Users who may not read ir.model get the schema
+    refetched every check_every seconds instead. With a DiskStore schemas survive restarts, so
+    type-aware decoding and field validation usually cost no round-trip at all.
+    """
+    attributes = ['string', 'help', 'type', 'relation']
+    check_every = 3600.
+
+    def __init__(self, requester, store: DiskStore=None):
+        self.req = requester
+        self.store = store
+        self._schemas: Dict[str, Schema] = dict()
+        self._pending: Dict[str, asyncio.Future] = dict()
+        self._access: Dict[Tuple[str, Any], FieldAccess] = dict()
+
+    def _cached(self, model: str) -> Optional[Schema]:
+        schema = self._schemas.get(model)
+        if schema is None and self.store is not None:
+            schema = self.store.load_schema(model)
+            if schema is not None:
+                self._schemas[model] = schema
+        return schema
+
+    def held(self, model: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        """field name -> attributes of model if its schema is held (in memory or on disk), without a round-trip"""
+        schema = self._cached(model)
+        return schema.fields if schema is not None else None
+
+    async def fields(self, model: str) -> Dict[str, Dict[str, Any]]:
+        """field name -> attributes (string, help, type, relation) of model"""
+        schema = self._cached(model)
+        if schema is not None and time.time() - schema.checked_at < self.check_every:
+            return schema.fields
+
+        # concurrent requests for the same model share one refresh
+        if model not in self._pending:
+            self._pending[model] = asyncio.ensure_future(self._refresh(model, schema))
+            self._pending[model].add_done_callback(lambda _: self._pending.pop(model, None))
+        return (await asyncio.shield(self._pending[model])).fields
+
+    async def types(self, model: str, fields: Iterable[str]=()) -> Dict[str, str]:
+        """field name -> odoo field type, for fields or all fields of model"""
+        schema = await self.fields(model)
+        fields = list(fields) or schema
+        return dict((field, schema[field]['type']) for field in fields if field in schema)
+
+    async def unknown(self, model: str, fields: Iterable[str]) -> List[str]:
+        schema = await self.fields(model)
+        return [field for field in fields if field not in schema and field not in MAGIC_FIELDS]
+
+    async def permitted_fields(self, model: str, fields: Iterable[str]=()) -> List[str]:
+        """
+        The fields (default: all fields of the schema) the logged in user may read on model.
+
+        Fields are probed with search_read calls for at most one entry: the whole list at once, and
+        lists that fault are split in halves until the offending fields are isolated. k forbidden
+        fields out of n cost O(k log n) calls. Results are kept per user until the schema changes.
+        """
+        schema = await self.fields(model)
+        write_date = self._schemas[model].write_date
+        fields = sorted(set(fields or schema))
+
+        key = (model, self.req.cred.uid)
+        access = self._access.get(key)
+        if access is None and self.store is not None:
+            access = self.store.load_field_access(*key)
+        if access is None or access.write_date != write_date:
+            access = FieldAccess(write_date)
+        self._access[key] = access
+
+        untested = [field for field in fields if field not in access.tested]
+        if untested:
+            start = time.perf_counter()
+            calls = [0]
+            permitted = await self._probe(model, untested, calls)
+            access.tested.update(untested)
+            access.permitted.update(permitted)
+            if self.store is not None:
+                self.store.save_field_access(*key, access)
+            logging.info(f'{model}: {len(permitted)} of {len(untested)} fields permitted. '
+                         f'Found in {calls[0]} calls, {time.perf_counter() - start:.2f}s')
+
+        return [field for field in fields if field in access.permitted]
+
+    async def _probe(self, model: str, fields: Sequence[str], calls: List[int]) -> List[str]:
+        calls[0] += 1
+        try:
+            await self.req.execute_kw(model, 'search_read', [[]], fields=list(fields), limit=1)
+        except xmlrpc.client.Fault:
+            if len(fields) == 1:
+                return list()
+            middle = len(fields) // 2
+            left, right = await asyncio.gather(self._probe(model, fields[:middle], calls),
+                                               self._probe(model, fields[middle:], calls))
+            return left + right
+        return list(fields)
+
+    async def _write_date(self, model: str) -> Optional[str]:
+        """write_date of the ir.model record of model, None if it cannot be read"""
+        try:
+            res = await self.req.execute_kw('ir.model', 'search_read', [[['model', '=', model]]],
+                                            fields=['write_date'])
+        except xmlrpc.client.Fault as exc:
+            logging.info(f'Cannot read ir.model ({exc.faultString.strip()}). '
+                         f'Refetching the schema of {model} every {self.check_every:.0f}s')
+            return None
+        return res[0]['write_date'] if res else None
+
+    async def _fields_get(self, model: str) -> Dict[str, Dict[str, Any]]:
+        return await self.req.execute_kw(model, 'fields_get', [], attributes=self.attributes)
+
+    async def _refresh(self, model: str, schema: Optional[Schema]) -> Schema:
+        if schema is None:
+            write_date, fields = await asyncio.gather(self._write_date(model), self._fields_get(model))
+            schema = Schema(fields, write_date)
+            logging.debug(f'Fetched schema of {model}: {len(fields)} fields')
+        else:
+            write_date = await self._write_date(model)
+            # without a write_date there is nothing to compare, the schema is refetched once it expires
+            if write_date is None or write_date != schema.write_date:
+                schema = Schema(await self._fields_get(model), write_date)
+                logging.debug(f'Schema of {model} changed at {write_date}. Fetched {len(schema.fields)} fields')
+
+        schema.checked_at = time.time()
+        self._schemas[model] = schema
+        if self.store is not None:
+            self.store.save_schema(model, schema)
+        return schema
+
+    def invalidate(self, model: str=None):
+        if model is None:
+            self._schemas.clear()
+            self._access.clear()
+        else:
+            self._schemas.pop(model, None)
+            for key in [key for key in self._access if key[0] == model]:
+                del self._access[key]
+        if self.store is not None:
+            self.store.delete_schema(model)
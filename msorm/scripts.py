@@ -7,6 +7,8 @@ from operator import itemgetter
 from msorm.utils import cosine_compare_to_list
 from .login import Credentials, Requester
 from .models import Event, Filter, Registration, Profile, Answer, Question
+from .normalize import normalize
+from .sync import SyncEngine
 import logging
 
 class State(Enum):
@@ -20,11 +22,35 @@ class State(Enum):
     DIDNOTFINISH = "notdone"# Ikke gennemført (der menes sikker at kurset ikke blev gennemført)
     DIDNOTATTEND = "noshow" # Ikke mødt op  (der menes sikker at man ikke var der til kursusstart)
 
+def _exported(value):
+    """Normalized entries hold None for empty fields. The exported signup data has always held odoo's False"""
+    return False if value is None else value
+
+
+async def registration_counts(requester: Requester, event_codes):
+    """event code -> state -> number of registrations, counted by the server"""
+    events = await Event(requester).get_entries('event_code', filters=Filter('event_code').In(*event_codes))
+    code_of = dict((e['id'], e['event_code']) for e in events)
+    groups = await Registration(requester).aggregate(['event_id', 'state'],
+                                                     filters=Filter('event_id').In(*code_of),
+                                                     lazy=False)
+    counts = defaultdict(dict)
+    for group in groups:
+        counts[code_of[group['event_id'][0]]][group['state']] = group['__count']
+    return counts
+
+
 async def get_signup_data(main_event_code,
                           requester: Requester,
                           other_event_codes,
                           questions_of_interest: dict,
-                          limit=None):
+                          limit=None,
+                          incremental=False):
+    """
+    With incremental, the registrations and answers of the main event are kept as write_date synced
+    snapshots, so repeated runs only pull what changed since the previous run. Records deleted since are
+    dropped on every run.
+    """
     logging.debug('Example: show basic info for all members you have access to')
     event_req = Event(requester)
     reg_req = Registration(requester)
@@ -40,17 +66,28 @@ async def get_signup_data(main_event_code,
                                               'event_moveto_ids',
                                               filters=Filter('event_code') == main_event_code))[0]
 
+    async def get_registrations():
+        if not incremental:
+            return await reg_req.get_entries('member_id',
+                                             'state',
+                                             ids=main_event["registration_ids"][:limit], use_cache=True,
+                                             normalized=True)
+
+        snapshot = SyncEngine(reg_req, 'member_id', 'state', filters=Filter('event_id') == main_event["id"])
+        # deleted records are found by one bare search, cheap enough to run on every export
+        await snapshot.sync(reconcile=True)
+        return await reg_req.normalize((await snapshot.entries())[:limit])
+
     logging.debug('fetching events, questions and registrations')
-    other_events, questions, registrations = await asyncio.gather(
-        event_req.get_entries('registration_ids',
-                              'event_code',
-                              filters=Filter('event_code').In(*other_event_codes)),
-        question_req.get_entries('event_question_option_ids', 'name',
-                                 ids=main_event["event_question_ids"]),
-        reg_req.get_entries('member_id',
-                            'state',
-                            ids=main_event["registration_ids"][:limit]),
-    )
+    with requester.batch():
+        other_events, questions, registrations = await asyncio.gather(
+            event_req.get_entries('registration_ids',
+                                  'event_code',
+                                  filters=Filter('event_code').In(*other_event_codes)),
+            question_req.get_entries('event_question_option_ids', 'name',
+                                     ids=main_event["event_question_ids"], use_cache=True),
+            get_registrations(),
+        )
 
     relevant_questions = [q for q in questions if q['name'] in questions_of_interest.keys()]
     question_names = set(q['name'] for q in relevant_questions)
@@ -66,45 +103,52 @@ async def get_signup_data(main_event_code,
     answer_filt += Filter('event_id') == main_event["id"]
 
     profile_filter = Filter('active') == True
-    profile_filter += Filter('member_id').In(*(reg['member_id'][0] for reg in registrations if reg['member_id']))
+    member_ids = [reg['member_id'] for reg in registrations if reg['member_id'] is not None]
+    profile_filter += Filter('member_id').In(*member_ids)
 
     prev_course_filter = Filter('event_id').In(*(e['id'] for e in other_events))
-    prev_course_filter += Filter('member_id').In(*(reg['member_id'][0] for reg in registrations if reg['member_id']))
+    prev_course_filter += Filter('member_id').In(*member_ids)
     prev_course_filter += Filter("state").In(State.CONFIRMED.value, State.WAITLIST.value, State.CANCELLED.value,
                                              State.DIDNOTFINISH.value, State.REJECTED.value, State.DIDNOTATTEND.value)
 
-    print('fetching answers, profiles and prev courses')
-    answers, profiles, prev_course_registrations = await asyncio.gather(
-        answer_req.get_entries(filters=answer_filt),
-        profile_req.get_entries(filters=profile_filter),
-        reg_req.get_entries('event_id', 'member_id', 'state', filters=prev_course_filter),
-    )
-
-
-    rid2answers = defaultdict(lambda :defaultdict(list))
-    for answer in answers:
-        rid = answer['event_registration_id'][0]
-
-        subject = answer['event_question_id'][1]
-        if answer['event_question_option_id'] is not False:
-            response = answer['event_question_option_id'][1]
-            rid2answers[rid][subject].append(response)
-        else:
-            rid2answers[rid][subject] = answer['response']
-
-    eid2event_code = dict((e['id'], e['event_code']) for e in other_events)
-
-    mid2reg = dict()
-    registrations.sort(key=itemgetter('id'), reverse=True)
-    for r in registrations:
-        if not r['member_id']:
-            continue
-
-        mid = r['member_id'][0]
-        if mid in mid2reg:
-            continue
+    # answers are held by answer_req, indexed by event_registration_id
+    async def collect_answers():
+        if not incremental:
+            # the field types are fetched while the first page is
+            types = asyncio.ensure_future(answer_req.field_types(*Answer.default_fields))
+            async for page in answer_req.iter_entries(filters=answer_filt, batches=True):
+                answer_req.extend(normalize(page, await types))
+            return
+
+        snapshot = SyncEngine(answer_req, filters=answer_filt)
+        # deleted records are found by one bare search, cheap enough to run on every export
+        await snapshot.sync(reconcile=True)
+        answer_req.extend(await answer_req.normalize(await snapshot.entries()))
+
+    def answers_of(registration_id):
+        """question name -> response, or the list of chosen options"""
+        answers = defaultdict(list)
+        for answer in answer_req.lookup('event_registration_id', registration_id):
+            subject = answer.event_question_id_name
+            if answer.event_question_option_id is not None:
+                answers[subject].append(answer.event_question_option_id_name)
+            else:
+                answers[subject] = _exported(answer.response)
+        return answers
 
-        mid2reg[mid] = r
+    print('fetching answers, profiles and prev courses')
+    with requester.batch():
+        _, profiles, prev_course_registrations = await asyncio.gather(
+            collect_answers(),
+            # birthdates are kept as strings for the json output
+            profile_req.get_entries(filters=profile_filter, use_cache=True, normalized=True, parse_dates=False),
+            reg_req.get_entries('event_id', 'member_id', 'state', filters=prev_course_filter, use_cache=True,
+                                normalized=True),
+        )
+
+    events = Event(requester, entries=other_events)
+    # the registrations of the main event by member_id
+    mid2reg_ids = reg_req.extend(registrations).groups('member_id')
 
     assignable_courses = set(main_event['event_moveto_ids'])
 
@@ -115,13 +159,13 @@ async def get_signup_data(main_event_code,
     mid2assigned_courses = defaultdict(list)
     mid2assigned_state = defaultdict(lambda: None)
     for pc in prev_course_registrations:
-        event_id = pc['event_id'][0]
-        event_code = eid2event_code[event_id]
+        event_id = pc['event_id']
+        event_code = events[event_id].event_code
         if event_code == main_event_code:
             # Ignore state of current waitlist
             continue
 
-        member_id = pc['member_id'][0]
+        member_id = pc['member_id']
         hash_pair = (member_id, event_id)
         if hash_pair in seen:
             continue
@@ -145,41 +189,30 @@ async def get_signup_data(main_event_code,
         else:
             continue
 
-        d[member_id].append(eid2event_code[event_id])
+        d[member_id].append(event_code)
 
 
     signups = dict()
     for profile in profiles:
-        mid = profile['member_id'][0]
-        gruppe = profile['primary_membership_organization_id']
-        if gruppe is False:
-            gruppe = None
-        else:
-            gruppe = gruppe[1]
-
-        division = profile['organization_structure_parent_id']
-        if division is False:
-            division = None
-        else:
-            division = division[1]
-
-        data = dict(gender=profile['gender'], birthdate=profile['birthdate'],
-                    gruppe=gruppe,
-                    division=division,
-                    member_number=profile['member_number'],
-                    name=profile['member_id'][1],
+        mid = profile['member_id']
+        data = dict(gender=_exported(profile['gender']), birthdate=_exported(profile['birthdate']),
+                    gruppe=profile['primary_membership_organization_id_name'],
+                    division=profile['organization_structure_parent_id_name'],
+                    member_number=_exported(profile['member_number']),
+                    name=_exported(profile['member_id_name']),
                     prev_courses=mid2prev_courses[mid],
                     prev_waitlists=mid2prev_waitlists[mid],
                     assigned_courses=mid2assigned_courses[mid]
                     )
 
-        reg = mid2reg[mid]
-        state = reg['state']
+        # the latest registration of the member
+        reg = reg_req[max(mid2reg_ids[mid])]
+        state = reg.state
         if state == State.MOVED.value and mid2assigned_state[mid]:
             state = f'{state}_{mid2assigned_state[mid].value}'
 
         data.update(state=state)
-        answer = rid2answers[reg['id']]
+        answer = answers_of(reg.id)
 
         for question_name, default_value in questions_of_interest.items():
             if question_name not in answer:
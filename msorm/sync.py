@@ -0,0 +1,88 @@
+import json
+import logging
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from .cache import SyncState
+from .domain import domain_key
+from .models import Filter, ModelBase
+
+
+class SyncResult(NamedTuple):
+    updated: List[int]
+    deleted: List[int]
+    reconciled: bool
+
+
+class SyncEngine:
+    """
+    Keeps a local snapshot of the records of a model matching filters up to date.
+
+    Each sync only pulls records with a write_date at or after the high-watermark of the previous sync
+    and merges them into the Requester's record cache. Records deleted on the server (or no longer
+    matching filters) are found by comparing the snapshot ids with a bare "search" at most once per
+    reconcile_every seconds. The state is kept per model and scope (fields + filters) and persisted
+    in the DiskStore if the Requester has one.
+    """
+    def __init__(self,
+                 model: ModelBase,
+                 *fields,
+                 filters: Optional[List]=None,
+                 reconcile_every: float=24 * 3600):
+        self.model = model
+        self.fields = list(fields or model.default_fields)
+        self.domain = Filter.make_filters(filters or [])
+        self.reconcile_every = reconcile_every
+        self.scope = json.dumps([sorted(self.fields), self.domain])
+        self._state: SyncState = None
+
+    @property
+    def store(self):
+        return self.model.req.cache.store
+
+    @property
+    def state(self) -> SyncState:
+        if self._state is None:
+            self._state = (self.store and self.store.load_sync_state(self.model.name, self.scope)) or SyncState()
+        return self._state
+
+    async def sync(self, reconcile: bool=None) -> SyncResult:
+        state = self.state
+        domain = list(self.domain)
+        if state.watermark is not None:
+            # records written within the same second as the watermark may not have been seen yet
+            domain.extend(Filter('write_date') >= state.watermark)
+
+        delta = await self.model._search_chunked(domain, fields=[*self.fields, 'write_date', '__last_update'])
+        self.model.req.cache.put(self.model.name, delta)
+        state.ids.update(entry['id'] for entry in delta)
+        state.watermark = max((e['write_date'] for e in delta if e['write_date']), default=state.watermark)
+
+        if reconcile is None:
+            reconcile = time.time() - state.reconciled_at > self.reconcile_every
+
+        deleted = list()
+        if reconcile:
+            ids = set(await self.model._search_chunked(self.domain, action='search'))
+            deleted = sorted(state.ids - ids)
+            self.model.req.cache.invalidate(self.model.name, deleted)
+            state.ids = ids
+            state.reconciled_at = time.time()
+
+        # whatever was not pulled has not been written since the previous sync
+        self.model.req.cache.verify(self.model.name, state.ids)
+        if reconcile:
+            # the snapshot is known to be complete, so narrower filters can be evaluated on it locally
+            self.model.req.cache.cover(self.model.name, domain_key(self.domain), state.ids)
+        if self.store is not None:
+            self.store.save_sync_state(self.model.name, self.scope, state)
+
+        logging.debug(f'Synced {self.model.name}: {len(delta)} updated, {len(deleted)} deleted, '
+                      f'{len(state.ids)} in snapshot')
+        return SyncResult([entry['id'] for entry in delta], deleted, reconcile)
+
+    async def entries(self) -> List[Dict[str, Any]]:
+        """The snapshot. Entries evicted from the record cache are read again."""
+        if not self.state.ids:
+            return list()
+        return await self.model.get_entries(*self.fields, ids=sorted(self.state.ids), use_cache=True)
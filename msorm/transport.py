@@ -0,0 +1,330 @@
+import asyncio
+import gzip
+import itertools
+import json
+import logging
+import ssl
+import xmlrpc.client
+import zlib
+from abc import ABC, abstractmethod
+from typing import NamedTuple, Optional
+
+import aiohttp
+
+from .xmlparse import FastParser, Rows
+
+
+class PoolConfig(NamedTuple):
+    limit: int = 32                 # total number of open connections
+    limit_per_host: int = 8         # connections kept against the odoo host
+    keepalive_timeout: float = 75.  # seconds an idle connection is kept warm
+    dns_cache_ttl: int = 600
+
+
+class PoolStats:
+    def __init__(self):
+        self.hits = 0       # request served by an already open connection
+        self.misses = 0     # request had to open a new connection (TCP + TLS handshake)
+        self.queued = 0     # request had to wait for a free connection
+        self.requests = 0
+
+    def __repr__(self):
+        return (f'<PoolStats requests={self.requests} hits={self.hits} '
+                f'misses={self.misses} queued={self.queued}>')
+
+
+class ConnectionPool:
+    """
+    Keep-alive connection pool shared by every endpoint a Requester talks to.
+
+    The aiohttp session is created lazily so that the pool can be constructed outside of a running loop.
+    One SSLContext is shared by all connections, so certificates are only loaded once.
+    """
+    def __init__(self, config: PoolConfig=None):
+        self.config = config or PoolConfig()
+        self.stats = PoolStats()
+        self.ssl_context = ssl.create_default_context()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _trace_config(self):
+        trace = aiohttp.TraceConfig()
+
+        async def on_request_start(*_):
+            self.stats.requests += 1
+
+        async def on_reuse(*_):
+            self.stats.hits += 1
+
+        async def on_create(*_):
+            self.stats.misses += 1
+
+        async def on_queued(*_):
+            self.stats.queued += 1
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_connection_reuseconn.append(on_reuse)
+        trace.on_connection_create_end.append(on_create)
+        trace.on_connection_queued_start.append(on_queued)
+        return trace
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.config.limit,
+                                             limit_per_host=self.config.limit_per_host,
+                                             keepalive_timeout=self.config.keepalive_timeout,
+                                             ttl_dns_cache=self.config.dns_cache_ttl,
+                                             ssl=self.ssl_context)
+            # transports decompress themselves so they can count bytes on the wire
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  auto_decompress=False,
+                                                  trace_configs=[self._trace_config()])
+            self._loop = asyncio.get_event_loop()
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            logging.debug(f'Closing connection pool: {self.stats}')
+            await self._session.close()
+        self._session = None
+
+    def close_blocking(self):
+        """close() for callers outside of a running loop. The session is closed on the loop it was opened on"""
+        if self._session is not None and not self._session.closed and not self._loop.is_closed():
+            self._loop.run_until_complete(self.close())
+        self._session = None
+
+
+class TransferStats:
+    def __init__(self):
+        self.sent = 0           # request bytes before compression
+        self.sent_wire = 0
+        self.received = 0       # response bytes after decompression
+        self.received_wire = 0
+
+    def __repr__(self):
+        return (f'<TransferStats sent={self.sent} (wire {self.sent_wire}) '
+                f'received={self.received} (wire {self.received_wire})>')
+
+
+COMPRESSION_MODES = ('none', 'response', 'both')
+
+
+def as_rows(result):
+    if isinstance(result, list) and not isinstance(result, Rows) and all(isinstance(r, dict) for r in result):
+        return Rows.from_dicts(result)
+    return result
+
+
+def _deflate_decompressor(head: bytes):
+    """
+    Decompressor for a "deflate" body starting with head. That should be zlib wrapped deflate (RFC 1950),
+    but some servers send raw deflate streams. A zlib header is 0x?8 and divisible by 31 as big endian int
+    """
+    if head[0] & 0x0f == 8 and int.from_bytes(head[:2], 'big') % 31 == 0:
+        return zlib.decompressobj()
+    return zlib.decompressobj(-zlib.MAX_WBITS)
+
+
+class Transport(ABC):
+    """
+    Calls a method of an odoo RPC service ("common", "object", "db") over the connection pool.
+
+    With rows=True a list of entries is returned as xmlparse.Rows (one tuple per entry).
+
+    compression is "none", "response" (ask for gzip/deflate responses) or "both" (also gzip request bodies
+    of at least gzip_min_size bytes). The server must be set up to accept compressed requests;
+    werkzeug, which odoo runs on, does not decode them by itself.
+    """
+    supports_multicall = False
+    gzip_min_size = 2 ** 14
+    chunk_size = 2 ** 16
+    headers = {'User-Agent': 'python/msorm'}
+
+    def __init__(self, pool: ConnectionPool, domain: str, compression: str='response'):
+        if compression not in COMPRESSION_MODES:
+            raise ValueError(f'Unknown compression "{compression}". Choose one of {", ".join(COMPRESSION_MODES)}')
+        self.pool = pool
+        self.domain = domain
+        self.compression = compression
+        self.stats = TransferStats()
+
+    @abstractmethod
+    async def call(self, service, method, *params, rows: bool=False):
+        pass
+
+    async def stream(self, service, method, *params):
+        """Yield the elements of a list result. Transports that can decode incrementally override this"""
+        for item in await self.call(service, method, *params):
+            yield item
+
+    async def _post(self, url, body: bytes) -> aiohttp.ClientResponse:
+        headers = dict(self.headers)
+        headers['Accept-Encoding'] = 'identity' if self.compression == 'none' else 'gzip, deflate'
+        self.stats.sent += len(body)
+        if self.compression == 'both' and len(body) >= self.gzip_min_size:
+            body = gzip.compress(body, compresslevel=5)
+            headers['Content-Encoding'] = 'gzip'
+        self.stats.sent_wire += len(body)
+
+        response = await self.pool.session.post(url, data=body, headers=headers)
+        if response.status != 200:
+            response.release()
+            raise xmlrpc.client.ProtocolError(url, response.status, response.reason, response.headers)
+        return response
+
+    async def _body(self, response: aiohttp.ClientResponse):
+        """Yield the decompressed response body chunk by chunk"""
+        encoding = response.headers.get('Content-Encoding', 'identity').lower()
+        deflate = encoding == 'deflate'
+        if encoding == 'gzip':
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        else:
+            # for deflate the format is only known from the first bytes
+            decompressor = None
+        head = b''
+
+        async for chunk in response.content.iter_chunked(self.chunk_size):
+            self.stats.received_wire += len(chunk)
+            if deflate and decompressor is None:
+                head += chunk
+                if len(head) < 2:
+                    continue
+                decompressor, chunk = _deflate_decompressor(head), head
+            if decompressor is not None:
+                chunk = decompressor.decompress(chunk)
+            self.stats.received += len(chunk)
+            yield chunk
+
+        if deflate and decompressor is None and head:
+            decompressor = _deflate_decompressor(head)
+            head = decompressor.decompress(head)
+            self.stats.received += len(head)
+            yield head
+        if decompressor is not None:
+            tail = decompressor.flush()
+            self.stats.received += len(tail)
+            yield tail
+
+    async def _read(self, response: aiohttp.ClientResponse) -> bytes:
+        return b''.join([chunk async for chunk in self._body(response)])
+
+
+class XmlRpcTransport(Transport):
+    supports_multicall = True
+    # decode responses with xmlparse.FastParser instead of the stock xmlrpc.client unmarshaller
+    fast_parser = True
+    headers = {'User-Agent': 'python/msorm',
+               'Accept': 'text/xml',
+               'Content-Type': 'text/xml'}
+
+    def url(self, service):
+        return f'https://{self.domain}/xmlrpc/2/{service}'
+
+    async def _call_post(self, service, method, params):
+        return await self._post(self.url(service), xmlrpc.client.dumps(params, method).encode('utf-8'))
+
+    async def call(self, service, method, *params, rows: bool=False):
+        async with await self._call_post(service, method, params) as response:
+            if not self.fast_parser:
+                data = await self._read(response)
+                parser, unmarshaller = xmlrpc.client.getparser()
+                parser.feed(data)
+                parser.close()
+                # raises xmlrpc.client.Fault if the server responded with a fault
+                result = unmarshaller.close()
+                if rows:
+                    result = tuple(as_rows(r) for r in result)
+            else:
+                # decode while the body arrives instead of holding the raw body and the result at once
+                parser = FastParser(rows=rows)
+                async for chunk in self._body(response):
+                    parser.feed(chunk)
+                result = parser.close()
+
+        if len(result) == 1:
+            return result[0]
+        return result
+
+    async def stream(self, service, method, *params):
+        if not self.fast_parser:
+            async for item in super().stream(service, method, *params):
+                yield item
+            return
+
+        parser = FastParser()
+        async with await self._call_post(service, method, params) as response:
+            async for chunk in self._body(response):
+                parser.feed(chunk)
+                for item in parser.take_items():
+                    yield item
+
+        # raises xmlrpc.client.Fault if the server responded with a fault
+        result = parser.close()
+        for item in result[0] if len(result) == 1 and isinstance(result[0], list) else ():
+            yield item
+
+
+class JsonRpcTransport(Transport):
+    headers = {'User-Agent': 'python/msorm',
+               'Accept': 'application/json',
+               'Content-Type': 'application/json'}
+
+    # odoo exception types mapped to the fault codes the XML-RPC endpoint uses for them
+    fault_codes = {
+        'access_denied': 3,
+        'access_error': 4,
+        'except_orm': 2,
+        'except_osv': 2,
+        'warning': 2,
+        'redirect_warning': 2,
+        'missing_error': 2,
+        'validation_error': 2,
+    }
+    application_error = 1
+
+    def __init__(self, pool: ConnectionPool, domain: str, compression: str='response'):
+        super().__init__(pool, domain, compression)
+        self._ids = itertools.count()
+
+    def url(self):
+        return f'https://{self.domain}/jsonrpc'
+
+    def fault(self, error: dict) -> xmlrpc.client.Fault:
+        data = error.get('data') or dict()
+        exception_type = data.get('exception_type')
+        if exception_type is None and data.get('name', '').endswith('AccessDenied'):
+            exception_type = 'access_denied'
+        message = data.get('message') or error.get('message', '')
+        return xmlrpc.client.Fault(self.fault_codes.get(exception_type, self.application_error), message)
+
+    async def call(self, service, method, *params, rows: bool=False):
+        url = self.url()
+        body = json.dumps(dict(jsonrpc='2.0',
+                               method='call',
+                               params=dict(service=service, method=method, args=params),
+                               id=next(self._ids))).encode('utf-8')
+        async with await self._post(url, body) as response:
+            data = await self._read(response)
+
+        reply = json.loads(data)
+        if reply.get('error'):
+            raise self.fault(reply['error'])
+        if rows:
+            return as_rows(reply['result'])
+        return reply['result']
+
+
+TRANSPORTS = {
+    'xmlrpc': XmlRpcTransport,
+    'jsonrpc': JsonRpcTransport,
+}
+
+
+def make_transport(name: str, pool: ConnectionPool, domain: str, compression: str='response') -> Transport:
+    try:
+        transport = TRANSPORTS[name]
+    except KeyError:
+        raise ValueError(f'Unknown transport "{name}". Choose one of {", ".join(TRANSPORTS)}') from None
+    return transport(pool, domain, compression)
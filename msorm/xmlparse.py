@@ -0,0 +1,204 @@
+"""
+Fast decoder for XML-RPC method responses.
+
+Produces the same values as xmlrpc.client's Unmarshaller, but instead of a handler call for every start
+and end tag, a single regular expression tokenizes the body into leaf values, member names and container
+boundaries, and leaf values are converted through a pre-built dispatch table. The structural noise
+(<data>, <member>, <param>, whitespace) is skipped inside the regex engine.
+
+With rows=True, arrays of structs that share the same keys (the typical search_read/read response) are
+decoded straight into a Rows list of tuples instead of one dict per entry.
+"""
+import base64
+import codecs
+import html
+import re
+import xmlrpc.client
+from typing import Any, Dict, Iterable, List, Tuple
+
+TOKEN = re.compile(r'<value>\s*<(string|int|i4|i8|boolean|double|dateTime\.iso8601|base64)>([^<]*)</\1>\s*</value>'
+                   r'|<value>\s*<(nil|string)/>\s*</value>'
+                   r'|<value>([^<]*)</value>'
+                   r'|<name>([^<]*)</name>'
+                   r'|<(/?)(struct|array|fault)>')
+DECLARATION = re.compile(br'<\?xml[^>]*encoding=["\']([A-Za-z0-9._-]+)["\']')
+
+
+def _string(value: str) -> str:
+    if '&' in value:
+        value = html.unescape(value)
+    if '\r' in value:
+        # an XML parser normalizes line endings
+        value = value.replace('\r\n', '\n').replace('\r', '\n')
+    return value
+
+
+def _boolean(value: str) -> bool:
+    if value == '1':
+        return True
+    if value == '0':
+        return False
+    raise TypeError(f'bad boolean value {value!r}')
+
+
+CONVERTERS = {
+    'string': _string,
+    'int': int,
+    'i4': int,
+    'i8': int,
+    'boolean': _boolean,
+    'double': float,
+    'dateTime.iso8601': xmlrpc.client.DateTime,
+    'base64': lambda value: xmlrpc.client.Binary(base64.decodebytes(value.encode('ascii'))),
+}
+EMPTY = {
+    'nil': None,
+    'string': '',
+}
+
+
+class Rows(list):
+    """An XML-RPC array of structs with identical keys, decoded as one tuple per struct"""
+    def __init__(self, fields: Tuple[str, ...], rows: Iterable[tuple]=()):
+        super().__init__(rows)
+        self.fields = fields
+
+    def __repr__(self):
+        return f'Rows({self.fields!r}, {super().__repr__()})'
+
+    def dicts(self) -> List[Dict[str, Any]]:
+        fields = self.fields
+        return [dict(zip(fields, row)) for row in self]
+
+    @classmethod
+    def from_dicts(cls, entries: List[Dict[str, Any]]) -> 'Rows':
+        if not entries:
+            return cls(())
+        fields = tuple(entries[0])
+        return cls(fields, (tuple(entry[f] for f in fields) for entry in entries))
+
+
+class _Struct(tuple):
+    """(keys, values) of a struct decoded in rows mode, waiting to be folded into Rows by its array"""
+
+
+def _as_dict(value):
+    if type(value) is _Struct:
+        return dict(zip(*value))
+    return value
+
+
+class FastParser:
+    """
+    Incremental XML-RPC response decoder. feed() bytes as they arrive and close() to get the params.
+
+    Only complete tokens are consumed, the unparsed tail of a chunk is kept until the next feed().
+    take_items() hands out the completed elements of the outermost array while the rest is still arriving.
+    """
+    def __init__(self, rows: bool=False):
+        self.rows = rows
+        self._decoder = None
+        self._head = b''
+        self._tail = ''
+        self._stack: List[Any] = list()
+        self._marks: List[int] = list()
+        self._kinds: List[str] = list()
+        self._keys: Dict[Tuple[str, ...], Tuple[str, ...]] = dict()
+        self._fault = None
+
+    def _decode(self, data: bytes, final=False) -> str:
+        if self._decoder is None:
+            self._head += data
+            if b'?>' not in self._head and not final:
+                return ''
+            declared = DECLARATION.search(self._head.split(b'?>', 1)[0])
+            encoding = declared.group(1).decode('ascii') if declared else 'utf-8'
+            self._decoder = codecs.getincrementaldecoder(encoding)()
+            data, self._head = self._head, b''
+        return self._decoder.decode(data, final)
+
+    def feed(self, data: bytes):
+        self._consume(self._tail + self._decode(data))
+
+    def _consume(self, text: str):
+        stack = self._stack
+        marks = self._marks
+        kinds = self._kinds
+        append = stack.append
+        rows = self.rows
+        end = 0
+        for match in TOKEN.finditer(text):
+            end = match.end()
+            type_, value, empty, bare, name, closing, container = match.groups()
+            if type_ is not None:
+                append(CONVERTERS[type_](value))
+            elif name is not None:
+                append(_string(name))
+            elif bare is not None:
+                append(_string(bare))
+            elif empty is not None:
+                append(EMPTY[empty])
+            elif not closing:
+                marks.append(len(stack))
+                kinds.append(container)
+            elif container == 'struct':
+                kinds.pop()
+                mark = marks.pop()
+                items = stack[mark:]
+                del stack[mark:]
+                keys = tuple(items[::2])
+                values = items[1::2]
+                if rows:
+                    keys = self._keys.setdefault(keys, keys)
+                    append(_Struct((keys, tuple(_as_dict(v) for v in values))))
+                else:
+                    append(dict(zip(keys, values)))
+            elif container == 'array':
+                kinds.pop()
+                mark = marks.pop()
+                items = stack[mark:]
+                del stack[mark:]
+                append(self._fold(items) if rows else items)
+            else:
+                kinds.pop()
+                mark = marks.pop()
+                fault = _as_dict(stack[mark])
+                self._fault = xmlrpc.client.Fault(fault['faultCode'], fault['faultString'])
+        self._tail = text[end:]
+
+    def take_items(self) -> List[Any]:
+        """Remove and return the elements of the outermost array that have been decoded completely"""
+        marks = self._marks
+        if not marks or self._kinds[0] != 'array':
+            return list()
+
+        start = marks[0]
+        stop = marks[1] if len(marks) > 1 else len(self._stack)
+        items = self._stack[start:stop]
+        del self._stack[start:stop]
+        for i in range(1, len(marks)):
+            marks[i] -= stop - start
+        return [_as_dict(item) for item in items]
+
+    @staticmethod
+    def _fold(items: List[Any]):
+        if items and type(items[0]) is _Struct:
+            keys = items[0][0]
+            if all(type(item) is _Struct and item[0] is keys for item in items):
+                return Rows(keys, (item[1] for item in items))
+        return [_as_dict(item) for item in items]
+
+    def close(self) -> Tuple:
+        self._consume(self._tail + self._decode(b'', final=True))
+        if self._fault is not None:
+            raise self._fault
+        if self._marks:
+            raise xmlrpc.client.ResponseError('Incomplete XML-RPC response')
+        return tuple(_as_dict(v) for v in self._stack)
+
+
+def loads(data: bytes, rows: bool=False) -> Tuple:
+    """Decode a complete methodResponse. Raises xmlrpc.client.Fault for fault responses."""
+    parser = FastParser(rows=rows)
+    parser.feed(data)
+    return parser.close()
@@ -13,3 +13,946 @@ questions = ['Info om forældre/værge', 'Forælders/værges navn under kursuspe
 
 def test_cosine():
     assert utils.cosine_compare_to_list('Vælg kurser', questions, 0.8)[0] == 'Vælg kurser:'
+
+
+def test_scheduler_fair_and_prioritized():
+    import asyncio
+    from msorm.scheduler import Priority, Scheduler
+
+    async def run():
+        scheduler = Scheduler(max_in_flight=1)
+        order = list()
+
+        async def job(key, priority):
+            await scheduler.run(key, priority, lambda: asyncio.sleep(0, result=order.append(key)))
+
+        await scheduler.acquire('blocker')
+        jobs = [asyncio.ensure_future(job(key, prio)) for key, prio in [('a', Priority.NORMAL),
+                                                                        ('a', Priority.NORMAL),
+                                                                        ('b', Priority.NORMAL),
+                                                                        ('c', Priority.HIGH)]]
+        await asyncio.sleep(0)
+        assert scheduler.waiting == 4
+        scheduler.release()
+        await asyncio.gather(*jobs)
+        return order
+
+    assert asyncio.new_event_loop().run_until_complete(run()) == ['c', 'a', 'b', 'a']
+
+
+def test_record_cache_subsets_and_invalidation():
+    from msorm.cache import RecordCache
+    cache = RecordCache(ttl=None)
+    cache.put('event.registration', [{'id': 1, 'state': 'open', 'member_id': [3, 'Name'], '__last_update': 'v1'}])
+    assert cache.get('event.registration', 1, ['state']) == {'id': 1, 'state': 'open'}
+    assert cache.missing('event.registration', [1, 2], ['state', 'member_id']) == [2]
+    assert cache.missing('event.registration', [1], ['event_id']) == [1]
+
+    cache.validate('event.registration', {1: 'v2'})
+    assert cache.get('event.registration', 1, ['state']) is None
+    assert cache.nbytes == 0
+
+
+def test_record_cache_invalidates_in_bulk(tmp_path):
+    from msorm.cache import DiskStore, RecordCache
+    deletes = list()
+
+    class Store(DiskStore):
+        def delete(self, model, ids=None):
+            deletes.append(ids)
+            super().delete(model, ids)
+
+    cache = RecordCache(ttl=None, store=Store(tmp_path / 'db.sqlite'))
+    cache.put('m', [{'id': i, 'state': 'open', '__last_update': 'v1'} for i in range(1, 5)])
+    cache.cover('m', 'a', [1, 2])
+    cache.cover('m', 'b', [3, 4])
+    cache.invalidate('m', [1, 2])
+    assert deletes == [[1, 2]] and list(cache.scopes('m')) == ['b']
+    assert sorted(cache.store.load('m')) == [3, 4]
+
+    cache.validate('m', {3: 'v2', 4: 'v2'})
+    assert deletes[1:] == [[3, 4]] and cache.scopes('m') == {} and len(cache) == 0
+
+def test_fast_parser_matches_stock_unmarshaller():
+    import xmlrpc.client
+    from msorm.xmlparse import FastParser, Rows, loads
+    entries = [{'id': i, 'name': f'<Spejder {i}> & co', 'member_id': [i, 'x'] if i % 2 else False, 'age': i / 2,
+                'x_<b&w>': i}
+               for i in range(50)]
+    data = xmlrpc.client.dumps((entries,), methodresponse=True).encode('utf-8')
+    parser, unmarshaller = xmlrpc.client.getparser()
+    parser.feed(data)
+    parser.close()
+    assert loads(data) == unmarshaller.close()
+    referenced = (b'<?xml version="1.0"?><methodResponse><params><param><value><struct>'
+                  b'<member><name>x_&#230;&#x27;</name><value><int>1</int></value></member>'
+                  b'</struct></value></param></params></methodResponse>')
+    assert loads(referenced) == ({'x_\xe6\'': 1},)
+
+    chunked = FastParser(rows=True)
+    for i in range(0, len(data), 13):
+        chunked.feed(data[i:i + 13])
+    rows, = chunked.close()
+    assert isinstance(rows, Rows) and rows.dicts() == entries
+
+
+def test_fast_parser_hands_out_items_while_feeding():
+    import xmlrpc.client
+    from msorm.xmlparse import FastParser
+    entries = [{'id': i, 'tag_ids': [i, i + 1], 'partner': {'id': i}} for i in range(20)]
+    data = xmlrpc.client.dumps((entries,), methodresponse=True).encode('utf-8')
+    parser = FastParser()
+    taken = list()
+    for i in range(0, len(data), 50):
+        parser.feed(data[i:i + 50])
+        taken.append(parser.take_items())
+    rest, = parser.close()
+    assert sum(1 for items in taken if items) > 5
+    assert [e for items in taken for e in items] + rest == entries
+
+
+def test_column_store_types_and_columns():
+    from array import array
+    from msorm.columnar import ColumnStore
+    store = ColumnStore()
+    store.extend([{'id': 1, 'state': 'open', 'age': 3, 'active': True}, {'id': 2, 'state': 'open', 'age': 4}])
+    assert isinstance(store.column('age'), array) and store.column('state')[0] is store.column('state')[1]
+    assert store.row(2) == ('open', 4, None)
+
+    store.extend([{'id': 1, 'age': False}])
+    store.add_column('member_id', {2: [7, 'Name']}, default=False)
+    assert store.row(1) == ('open', False, True, False)
+    assert list(store.to_frame(['age']).index) == [1, 2]
+
+
+def test_records_are_shared_classes_with_mapping_access():
+    from msorm.records import to_records
+    entries = [{'id': i, 'state': 'open', '__last_update': 'v1'} for i in range(3)]
+    records = to_records('event.registration', entries)
+    assert type(records[0]) is type(to_records('event.registration', entries[:1])[0])
+    assert records[1].state == 'open' and records[1]['__last_update'] == 'v1'
+    assert records == entries and not hasattr(records[0], '__dict__')
+
+    models, = to_records('ir.model', [{'id': 1, 'model': 'event.event', 'values': 2, 'get': 3, '_fields': 4}])
+    assert models.model == 'event.event' and models['values'] == 2 and models.get('get') == 3
+    assert models.to_dict() == {'id': 1, 'model': 'event.event', 'values': 2, 'get': 3, '_fields': 4}
+    assert list(models) == ['id', 'model', 'values', 'get', '_fields']
+    assert list(models.values()) == [1, 'event.event', 2, 3, 4]
+
+
+def test_frame_splits_many2one_and_nulls():
+    from msorm.frames import to_pandas
+    from msorm.xmlparse import Rows
+    rows = Rows(('id', 'member_id', 'date', 'tag_ids'), [(1, [7, 'Name'], '2018-02-01', [1, 2]),
+                                                         (2, False, False, [])])
+    df = to_pandas(rows, {'member_id': 'many2one', 'date': 'date', 'tag_ids': 'many2many'})
+    assert list(df.columns) == ['member_id', 'member_id_name', 'date', 'tag_ids']
+    assert df.loc[1, 'member_id'] == 7 and df.loc[1, 'member_id_name'] == 'Name'
+    assert df['member_id'].isna()[2] and df['date'].isna()[2] and df.loc[2, 'tag_ids'] == []
+
+
+def test_normalize_splits_many2one_and_parses_dates():
+    from datetime import date
+    from msorm.normalize import normalize
+    entries = [{'id': 1, 'member_id': [7, 'Name'], 'birthdate': '2001-02-03', 'active': False, 'email': False},
+               {'id': 2, 'member_id': False, 'birthdate': False, 'active': True, 'email': 'a@b'}]
+    types = {'member_id': 'many2one', 'birthdate': 'date', 'active': 'boolean', 'email': 'char'}
+    first, second = normalize(entries, types)
+    assert first == {'id': 1, 'member_id': 7, 'member_id_name': 'Name', 'birthdate': date(2001, 2, 3),
+                     'active': False, 'email': None}
+    assert second['member_id'] is None and second['member_id_name'] is None and second['birthdate'] is None
+
+
+def test_schema_registry_refetches_only_after_ir_model_change(tmp_path):
+    import asyncio
+    from msorm.cache import DiskStore
+    from msorm.schema import SchemaRegistry
+
+    class Requester:
+        write_date = 'v1'
+        calls = list()
+
+        async def execute_kw(self, model, method, *args, **kwargs):
+            self.calls.append(method)
+            if method == 'search_read':
+                return [{'id': 1, 'write_date': self.write_date}]
+            return {'state': {'type': 'selection'}}
+
+    async def run():
+        req = Requester()
+        store = DiskStore(tmp_path / 'db.sqlite')
+        assert await SchemaRegistry(req, store).types('event.registration') == {'state': 'selection'}
+        assert await SchemaRegistry(req, store).unknown('event.registration', ['id', 'state', 'x']) == ['x']
+        assert req.calls == ['search_read', 'fields_get']
+
+        registry = SchemaRegistry(req, store)
+        registry.check_every = 0
+        await registry.fields('event.registration')
+        req.write_date = 'v2'
+        await registry.fields('event.registration')
+        return req.calls
+
+    assert asyncio.new_event_loop().run_until_complete(run())[2:] == ['search_read', 'search_read', 'fields_get']
+
+def test_schema_registry_refetches_on_expiry_without_ir_model_access():
+    import asyncio
+    import xmlrpc.client
+    from msorm.schema import SchemaRegistry
+
+    class Requester:
+        calls = list()
+
+        async def execute_kw(self, model, method, *args, **kwargs):
+            self.calls.append(method)
+            if model == 'ir.model':
+                raise xmlrpc.client.Fault(4, 'AccessError')
+            return {'state': {'type': 'selection'}}
+
+    async def run():
+        req = Requester()
+        registry = SchemaRegistry(req)
+        assert await registry.types('event.registration') == {'state': 'selection'}
+        await registry.fields('event.registration')
+        registry.check_every = 0
+        await registry.fields('event.registration')
+        return req.calls
+
+    assert asyncio.new_event_loop().run_until_complete(run()) == ['search_read', 'fields_get',
+                                                                  'search_read', 'fields_get']
+
+
+def test_permitted_fields_bisects_forbidden_fields():
+    import asyncio
+    import xmlrpc.client
+    from msorm.schema import SchemaRegistry
+    all_fields = [f'field_{i}' for i in range(64)]
+
+    class Requester:
+        class cred:
+            uid = 1
+        calls = 0
+
+        async def execute_kw(self, model, method, *args, fields=(), **kwargs):
+            if method == 'fields_get':
+                return dict((f, {'type': 'char'}) for f in all_fields)
+            if method == 'search_read' and model != 'ir.model':
+                self.calls += 1
+                if 'field_7' in fields or 'field_40' in fields:
+                    raise xmlrpc.client.Fault(4, 'AccessError')
+            return list()
+
+    async def run():
+        req = Requester()
+        registry = SchemaRegistry(req)
+        permitted = await registry.permitted_fields('member.profile')
+        assert await registry.permitted_fields('member.profile', ['field_7', 'field_8']) == ['field_8']
+        return permitted, req.calls
+
+    permitted, calls = asyncio.new_event_loop().run_until_complete(run())
+    assert set(all_fields) - set(permitted) == {'field_7', 'field_40'}
+    assert calls <= 2 * 2 * 6 + 1
+
+
+def test_recordset_prefetches_whole_group_per_hop():
+    import asyncio
+    from msorm.recordset import RecordSet
+    data = {'event.registration': {i: {'member_id': [i % 3 + 1, 'x'], 'state': 'open'} for i in range(1, 10)},
+            'member.member': {i: {'name': f'M{i}'} for i in range(1, 4)}}
+    schemas = {'event.registration': {'member_id': {'type': 'many2one', 'relation': 'member.member'},
+                                      'state': {'type': 'selection'}},
+               'member.member': {'name': {'type': 'char'}}}
+    reads = list()
+    fetched = set()
+
+    class Model:
+        prefetch_fields = None
+        default_fields = ['id']
+
+        def __init__(self, name):
+            self.name = name
+            self.req = self
+
+        @property
+        def schema(self):
+            return self
+
+        async def fields(self, name):
+            fetched.add(name)
+            return schemas[name]
+
+        def held(self, name):
+            return schemas[name] if name in fetched else None
+
+        def related(self, name):
+            return Model(name)
+
+        async def get_entries(self, *fields, ids, **kwargs):
+            reads.append((self.name, fields))
+            return [dict(id=i, **dict((f, data[self.name][i][f]) for f in fields)) for i in ids]
+
+    async def run():
+        names = list()
+        for registration in RecordSet(Model('event.registration'), range(1, 10)):
+            names.append(await (await registration.member_id).name)
+        return names
+
+    async def typo():
+        fetched.clear()
+        members = RecordSet(Model('member.member'), [1])
+        try:
+            await members.nmae
+        except AttributeError:
+            return not hasattr(members, 'nmae') and hasattr(members, 'name')
+
+    loop = asyncio.new_event_loop()
+    assert loop.run_until_complete(run()) == [f'M{i % 3 + 1}' for i in range(1, 10)]
+    assert reads == [('event.registration', ('member_id',)), ('member.member', ('name',))]
+    assert loop.run_until_complete(typo())
+
+
+def test_planner_merges_reads_and_shares_identical_calls():
+    import asyncio
+    import xmlrpc.client
+    from msorm.planner import Planner
+    calls = list()
+
+    async def execute(model, method, *args, priority, rows, **kwargs):
+        calls.append((method, kwargs.get('fields')))
+        await asyncio.sleep(0)
+        if method == 'read':
+            if 'secret' in kwargs['fields']:
+                raise xmlrpc.client.Fault(4, 'AccessError')
+            return [dict(id=i, **dict((f, f'{f}{i}') for f in kwargs['fields'])) for i in args[0][0]]
+        return [dict(id=1)]
+
+    async def run():
+        planner = Planner(execute)
+        results = await asyncio.gather(planner.call('m', 'read', [[1, 2]], fields=['a']),
+                                       planner.call('m', 'read', [[2, 3]], fields=['b']),
+                                       planner.call('m', 'search_read', [[]], fields=['a']),
+                                       planner.call('m', 'search_read', [[]], fields=['a']),
+                                       return_exceptions=True)
+        forbidden = await asyncio.gather(planner.call('m', 'read', [[1]], fields=['a']),
+                                         planner.call('m', 'read', [[2]], fields=['secret']),
+                                         return_exceptions=True)
+        return results, forbidden
+
+    results, forbidden = asyncio.new_event_loop().run_until_complete(run())
+    assert results[0] == [{'id': 1, 'a': 'a1'}, {'id': 2, 'a': 'a2'}]
+    assert results[1] == [{'id': 2, 'b': 'b2'}, {'id': 3, 'b': 'b3'}]
+    assert results[2] == results[3] and results[2] is not results[3]
+    assert sorted(calls[:2]) == [('read', ['a', 'b']), ('search_read', ['a'])]
+    assert forbidden[0] == [{'id': 1, 'a': 'a1'}] and isinstance(forbidden[1], xmlrpc.client.Fault)
+
+
+def test_planner_shares_rows_with_their_fields():
+    import asyncio
+    from msorm.planner import Planner
+    from msorm.xmlparse import Rows
+
+    async def execute(model, method, *args, priority, rows, **kwargs):
+        await asyncio.sleep(0)
+        return Rows(('id', 'state'), [(1, 'open'), (2, 'draft')])
+
+    async def run():
+        planner = Planner(execute)
+        return await asyncio.gather(*(planner.call('m', 'search_read', [[]], fields=['state'], rows=True)
+                                      for _ in range(2)))
+
+    first, second = asyncio.new_event_loop().run_until_complete(run())
+    assert isinstance(second, Rows) and second.dicts() == first.dicts() == [{'id': 1, 'state': 'open'},
+                                                                             {'id': 2, 'state': 'draft'}]
+    assert second is not first
+
+def test_domain_operators_fold_and_canonicalize():
+    from msorm.domain import FALSE, Domain, domain_key, normalize_domain
+    open_or_draft = Domain([['state', '=', 'open']]) | [['state', '=', 'draft']]
+    assert open_or_draft == [['state', 'in', ['draft', 'open']]]
+    assert hash(open_or_draft) == hash(Domain([['state', '=', 'draft']]) | [['state', '=', 'open']])
+    assert ~(Domain([['a', '=', 1]]) & [['b', 'in', [2, 3]]]) == ['|', ['a', '!=', 1], ['b', 'not in', [2, 3]]]
+    assert normalize_domain([['id', 'in', [1, 2, 3]], ['id', 'in', [3, 4]], [1, '=', 1]]) == [['id', '=', 3]]
+    # without knowing the type, "&" of "in" terms on another field may be an x2many and is left alone
+    assert len(normalize_domain([['tag_ids', 'in', [1]], ['tag_ids', 'in', [2]]])) == 2
+    assert domain_key([['member_id', 'in', []], ['state', '=', 'open']]) == FALSE
+    assert normalize_domain(['|', ['state', 'not in', []], ['a', '=', 1]]) == []
+
+
+def test_domain_keys_tell_false_and_zero_apart():
+    from msorm.domain import domain_key, normalize_domain
+    assert normalize_domain([['seats_min', '=', 0], ['seats_min', '=', False]]) == \
+        [['seats_min', '=', 0], ['seats_min', '=', False]]
+    assert normalize_domain(['|', ['seats_min', '=', 0], ['seats_min', '=', False]]) == [['seats_min', 'in', [False, 0]]]
+    assert domain_key([['x', '=', 0]]) != domain_key([['x', '=', False]])
+    assert domain_key([['active', '=', True]]) != domain_key([['active', '=', 1]])
+    assert len({domain_key([['x', 'in', [0, 1]]]), domain_key([['x', 'in', [False, True]]])}) == 2
+    assert domain_key([['x', '=', 0]]) == domain_key([['x', 'in', [0]]])
+
+def test_local_evaluation_matches_odoo_semantics():
+    from msorm.columnar import ColumnStore
+    from msorm.evaluate import NotEvaluable, candidates, filter_entries, select
+    from msorm.domain import domain_key
+    entries = [{'id': 1, 'member_id': [7, 'Anna'], 'state': 'open', 'score': 1.5, 'tag_ids': [1, 2], 'parent_id': False,
+                'write_date': '2018-01-01 10:00:00'},
+               {'id': 2, 'member_id': False, 'state': 'draft', 'score': 3.0, 'tag_ids': [], 'parent_id': [1, 'a'],
+                'write_date': '2018-01-02 10:00:00'},
+               {'id': 3, 'member_id': [8, 'Bo'], 'state': 'cancel', 'score': 2.0, 'tag_ids': [2], 'parent_id': [2, 'b'],
+                'write_date': '2018-01-03 10:00:00'}]
+    store = ColumnStore()
+    store.extend(entries)
+
+    def ids(domain):
+        by_store = select(store, domain)
+        assert by_store == [e['id'] for e in filter_entries(entries, domain)]
+        return by_store
+
+    assert ids([['member_id', '=', 7]]) == ids([['member_id', 'ilike', 'ann']]) == [1]
+    assert ids([['member_id', '!=', 7]]) == [2, 3]
+    assert ids([['member_id', '=', False]]) == ids([['tag_ids', '=', False]]) == [2]
+    assert ids([['tag_ids', 'in', [2]]]) == [1, 3]
+    assert ids(['|', ['score', '>', 2.5], '!', ['state', 'in', ['open', 'draft']]]) == [2, 3]
+    assert ids([['id', 'child_of', 2]]) == [2, 3] and ids([['id', 'parent_of', 2]]) == [1, 2]
+    # like wraps the operand in %, keeping its % and _ as wildcards. =like matches the whole value
+    assert ids([['state', 'like', 'p%n']]) == [1] and ids([['state', 'like', 'a_c']]) == [3]
+    assert ids([['state', '=like', 'p%n']]) == [] and ids([['state', 'not ilike', 'D_A']]) == [1, 3]
+    assert ids([['state', 'like', '\\_']]) == []
+    assert ids([['write_date', '>=', '2018-01-02']]) == [2, 3]
+    for domain in ([['member_id.name', '=', 'Bo']], [['state', '<', 'open']], [['member_id', '>', 'Anna']],
+                   [['write_date', '<', 'x']]):
+        try:
+            ids(domain)
+            assert False, domain
+        except NotEvaluable:
+            pass
+
+    scopes = {domain_key([['event_id', '=', 1]]): [1, 2, 3], domain_key([['state', 'in', ['open', 'draft']]]): [1, 2]}
+    assert candidates(domain_key([['state', '=', 'open'], ['score', '>', 1]]), scopes) == [1, 2]
+    assert candidates(domain_key([['event_id', '=', 1], ['state', '=', 'open']]), scopes) == [1, 2]
+    assert candidates(domain_key([['event_id', 'in', [1, 2]]]), scopes) is None
+    assert candidates(domain_key([['event_id', '=', True]]), scopes) is None
+
+
+def test_column_store_indexes_follow_updates():
+    from msorm.columnar import ColumnStore
+    store = ColumnStore(['member_id', 'tag_ids'])
+    store.extend([{'id': 1, 'member_id': [5, 'A'], 'tag_ids': [1, 2]},
+                  {'id': 2, 'member_id': False, 'tag_ids': []},
+                  {'id': 3, 'member_id': [5, 'A'], 'tag_ids': [2]}])
+    assert store.lookup('member_id', 5) == [1, 3] and store.lookup('member_id', False) == [2]
+    assert store.lookup('tag_ids', 2) == [1, 3]
+
+    store.extend([{'id': 3, 'member_id': [6, 'B']}, {'id': 4, 'member_id': 6}])
+    assert dict(store.groups('member_id')) == {5: [1], None: [2], 6: [3, 4]}
+    assert dict(store.select([4, 1]).groups('member_id')) == {6: [4], 5: [1]}
+    try:
+        store.lookup('state', 'open')
+        assert False
+    except ValueError:
+        pass
+
+
+def test_group_entries_like_read_group():
+    from msorm.aggregate import group_entries
+    entries = [{'id': 1, 'event_id': [1, 'A'], 'state': 'open', 'score': 2, 'tag_ids': [1, 2]},
+               {'id': 2, 'event_id': [1, 'A'], 'state': 'draft', 'score': 3, 'tag_ids': []},
+               {'id': 3, 'event_id': False, 'state': 'open', 'score': 4, 'tag_ids': [2]}]
+    types = {'event_id': 'many2one', 'state': 'selection', 'score': 'integer', 'tag_ids': 'many2many'}
+
+    lazy = group_entries(entries, ['event_id', 'state'], ['score'], types, domain=[['active', '=', True]])
+    assert [(g['event_id'], g['__count'], g['score']) for g in lazy] == [([1, 'A'], 2, 5), (False, 1, 4)]
+    assert lazy[1]['__domain'] == [['active', '=', True], ['event_id', '=', False]]
+    assert lazy[0]['__context'] == {'group_by': ['state']}
+
+    flat = group_entries(entries, ['event_id', 'state'], [], types, lazy=False)
+    assert [(g['event_id'], g['state'], g['__count']) for g in flat] == [([1, 'A'], 'open', 1), ([1, 'A'], 'draft', 1),
+                                                                         (False, 'open', 1)]
+    by_tag = group_entries(entries, ['tag_ids'], ['score'], types)
+    assert [(g['tag_ids'], g['__count'], g['score']) for g in by_tag] == [(1, 1, 2), (2, 2, 6), (False, 1, 3)]
+
+
+def test_json_rpc_errors_map_to_xml_rpc_fault_codes():
+    from msorm.transport import ConnectionPool, JsonRpcTransport
+    transport = JsonRpcTransport(ConnectionPool(), 'localhost')
+
+    def code(data):
+        return transport.fault({'code': 200, 'message': 'Odoo Server Error', 'data': data}).faultCode
+
+    assert code({'name': 'odoo.exceptions.AccessDenied', 'message': 'Access denied'}) == 3
+    assert code({'exception_type': 'access_error', 'message': 'no'}) == 4
+    assert code({'exception_type': 'validation_error', 'message': 'no'}) == 2
+    assert code({'exception_type': 'except_osv', 'message': 'no'}) == 2
+    assert code({'name': 'builtins.KeyError'}) == 1
+    assert transport.fault({'message': 'Odoo Server Error'}).faultString == 'Odoo Server Error'
+
+
+def test_transport_gzips_requests_and_decodes_gzip_responses():
+    import asyncio
+    import gzip
+    import xmlrpc.client
+    from aiohttp import web
+    from msorm.transport import ConnectionPool, XmlRpcTransport
+    received = list()
+
+    async def handler(request):
+        body = await request.read()
+        received.append(request.headers.get('Content-Encoding'))
+        # aiohttp has decoded the gzipped request body already
+        params, method = xmlrpc.client.loads(body)
+        response = xmlrpc.client.dumps((params[0] * 2,), methodresponse=True).encode('utf-8')
+        return web.Response(body=gzip.compress(response), headers={'Content-Encoding': 'gzip'})
+
+    class Transport(XmlRpcTransport):
+        gzip_min_size = 1024
+
+        def url(self, service):
+            return f'http://{self.domain}/xmlrpc/2/{service}'
+
+    async def run():
+        app = web.Application()
+        app.router.add_post('/xmlrpc/2/{service}', handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, 'localhost', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        pool = ConnectionPool()
+        transport = Transport(pool, f'localhost:{port}', compression='both')
+        try:
+            return transport, await transport.call('common', 'echo', 'x' * 10), \
+                await transport.call('common', 'echo', 'y' * 4000)
+        finally:
+            await pool.close()
+            await runner.cleanup()
+
+    transport, small, large = asyncio.new_event_loop().run_until_complete(run())
+    assert small == 'x' * 20 and large == 'y' * 8000
+    assert received == [None, 'gzip']
+    assert transport.stats.sent_wire < transport.stats.sent
+    assert transport.stats.received_wire < transport.stats.received
+
+def test_transport_decodes_zlib_and_raw_deflate_responses():
+    import asyncio
+    import zlib
+    from msorm.transport import ConnectionPool, XmlRpcTransport
+    body = b'<methodResponse>' * 200
+
+    class Content:
+        def __init__(self, data):
+            self.data = data
+
+        async def iter_chunked(self, size):
+            # single bytes first, so the format has to be told from a split header
+            yield self.data[:1]
+            yield self.data[1:2]
+            for i in range(2, len(self.data), size):
+                yield self.data[i:i + size]
+
+    class Response:
+        def __init__(self, data):
+            self.headers = {'Content-Encoding': 'deflate'}
+            self.content = Content(data)
+
+    raw = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    transport = XmlRpcTransport(ConnectionPool(), 'localhost')
+    loop = asyncio.new_event_loop()
+    for data in (zlib.compress(body), raw.compress(body) + raw.flush()):
+        assert loop.run_until_complete(transport._read(Response(data))) == body
+
+def test_credentials_base_defaults_transport_and_store(tmp_path, monkeypatch):
+    from msorm import login
+
+    class Credentials(login.CredentialsBase):
+        mno, db, domain, dbpass, uid = 1, 'db', 'localhost', 'pw', None
+
+        def get_or_set(self, key, prompt, passw=False, force=False):
+            return None
+
+        def clear(self, key):
+            pass
+
+    class JsonCredentials(Credentials):
+        transport = 'jsonrpc'
+
+    monkeypatch.setattr(login, 'CONFIG_DIR', tmp_path / 'ms')
+    cred = Credentials()
+    assert (cred.transport, cred.compression) == ('xmlrpc', 'response')
+    assert cred.store_path == tmp_path / 'ms' / 'db.sqlite' and cred.store_path.parent.is_dir()
+    assert JsonCredentials().transport == 'jsonrpc'
+
+
+class FakeOdoo:
+    """Serves execute_kw from records held in memory, in place of a Requester's transport"""
+    supports_multicall = True
+
+    class cred:
+        db, uid, dbpass, mno = 'db', 1, 'pw', 1
+        domain, transport, compression = 'localhost', 'xmlrpc', 'none'
+
+    def __init__(self, records):
+        from msorm.transport import TransferStats
+        self.records = records
+        self.calls = list()
+        self.stats = TransferStats()
+
+    def requester(self, store_path=None, **kwargs):
+        from msorm.login import Requester
+        cred = type('cred', (self.cred,), dict(store_path=store_path))
+        req = Requester(cred, persistent_schema=False, persistent_cache=store_path is not None, **kwargs)
+        req.transport = req.batcher.transport = self
+        req.batcher.supported = self.supports_multicall
+        return req
+
+    @staticmethod
+    def _matches(record, domain):
+        import operator
+        ops = {'=': operator.eq, '!=': operator.ne, '>=': operator.ge, '<': operator.lt,
+               'in': lambda v, values: v in values}
+        return all(ops[op](record[field], value) for field, op, value in domain)
+
+    def _entry(self, record, fields):
+        return dict(id=record['id'], **dict((f, record['write_date' if f == '__last_update' else f])
+                                            for f in fields or record if f != 'id'))
+
+    async def call(self, service, method, *params, rows=False):
+        import asyncio
+        import xmlrpc.client
+        from msorm.transport import as_rows
+        await asyncio.sleep(0)
+        if method == 'system.multicall':
+            raise xmlrpc.client.Fault(1, 'method "system.multicall" is not supported')
+        _, _, _, model, method, args, kwargs = params
+        self.calls.append((method, args, kwargs))
+        records = self.records.get(model, dict())
+        if method == 'fields_get':
+            types = {bool: 'boolean', int: 'integer', str: 'char'}
+            return dict((f, {'type': types[type(v)]}) for f, v in next(iter(records.values())).items())
+        if method == 'read':
+            if set(kwargs) - {'fields', 'context'}:
+                raise xmlrpc.client.Fault(1, f'read() got unexpected keyword arguments {sorted(kwargs)}')
+            result = [self._entry(records[id], kwargs.get('fields')) for id in args[0] if id in records]
+        else:
+            domain = args[0]
+            if 'active' in records.get(1, ()) and kwargs.get('context', {}).get('active_test', True) and \
+                    all(field != 'active' for field, _, _ in domain):
+                domain = [*domain, ['active', '=', True]]
+            found = [r for _, r in sorted(records.items(), reverse=kwargs.get('order') == 'id desc')
+                     if self._matches(r, domain)]
+            found = found[kwargs.get('offset', 0):][:kwargs.get('limit') or None]
+            if method == 'search':
+                return [r['id'] for r in found]
+            result = [self._entry(r, kwargs.get('fields')) for r in found]
+        return as_rows(result) if rows else result
+
+
+def registrations(n):
+    return {i: {'id': i, 'state': ['open', 'draft'][i % 2], 'write_date': f'2018-01-{i:02d} 00:00:00'}
+            for i in range(1, n + 1)}
+
+
+def test_read_chunks_keep_requested_order():
+    import asyncio
+    from msorm.models import ModelBase
+    odoo = FakeOdoo({'event.registration': registrations(10)})
+    model = ModelBase(odoo.requester(), 'event.registration')
+    model.read_chunk_size = 3
+    ids = [7, 2, 9, 1, 10, 4, 3, 8, 6, 5]
+
+    entries = asyncio.new_event_loop().run_until_complete(model.get_entries('state', ids=ids))
+    assert [e['id'] for e in entries] == ids
+    assert sorted(id for method, args, _ in odoo.calls for id in args[0]) == sorted(ids)
+
+
+def test_iter_entries_pages_with_offset_and_ids():
+    import asyncio
+    from msorm.models import ModelBase
+    odoo = FakeOdoo({'event.registration': registrations(10)})
+    model = ModelBase(odoo.requester(), 'event.registration')
+
+    async def run():
+        pages = [page async for page in model.iter_entries('state', filters=[], page_size=4, batches=True)]
+        by_ids = [e['id'] async for e in model.iter_entries('state', ids=[5, 1, 9], page_size=2)]
+        return pages, by_ids
+
+    pages, by_ids = asyncio.new_event_loop().run_until_complete(run())
+    assert [[e['id'] for e in page] for page in pages] == [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10]]
+    assert [kwargs['offset'] for method, _, kwargs in odoo.calls if method == 'search_read'] == [0, 4, 8]
+    assert by_ids == [5, 1, 9]
+
+
+def test_in_filters_are_split_only_without_order_and_paging():
+    import asyncio
+    from msorm.models import ModelBase
+    odoo = FakeOdoo({'event.registration': registrations(10)})
+    model = ModelBase(odoo.requester(), 'event.registration')
+    model.filter_chunk_size = 3
+    filters = [['id', 'in', list(range(1, 11))]]
+
+    async def ids(**kwargs):
+        return [e['id'] for e in await model.get_entries('state', filters=filters, **kwargs)]
+
+    async def run():
+        split = await ids()
+        calls = len(odoo.calls)
+        return split, calls, await ids(order='id desc'), await ids(order='id desc', limit=4, offset=1)
+
+    split, calls, ordered, paged = asyncio.new_event_loop().run_until_complete(run())
+    assert split == list(range(1, 11)) and calls == 4
+    assert ordered == list(range(10, 0, -1)) and paged == [9, 8, 7, 6] and len(odoo.calls) == 6
+
+def test_use_cache_reads_only_changed_entries():
+    import asyncio
+    from msorm.models import ModelBase
+    records = registrations(6)
+    odoo = FakeOdoo({'event.registration': records})
+    model = ModelBase(odoo.requester(), 'event.registration')
+
+    async def run():
+        first = await model.get_entries('state', filters=[['state', '=', 'open']], use_cache=True)
+        records[3].update(state='open', write_date='2018-01-02 00:00:00')
+        del odoo.calls[:]
+        second = await model.get_entries('state', filters=[['state', '=', 'open']], use_cache=True)
+        reads = [args[0] for method, args, _ in odoo.calls if method == 'read']
+        by_ids = await model.get_entries('state', ids=[4, 3], use_cache=True)
+        calls = len(odoo.calls)
+        model.req.cache.clear()
+        paged = await model.get_entries('state', filters=[['state', '=', 'open']], use_cache=True,
+                                        order='id desc', limit=2, context={'lang': 'da_DK'})
+        return first, second, reads, by_ids, calls, paged
+
+    first, second, reads, by_ids, calls, paged = asyncio.new_event_loop().run_until_complete(run())
+    assert [e['id'] for e in first] == [2, 4, 6]
+    assert second == [{'id': 2, 'state': 'open'}, {'id': 3, 'state': 'open'},
+                      {'id': 4, 'state': 'open'}, {'id': 6, 'state': 'open'}]
+    assert reads == [[3]]
+    assert by_ids == [{'id': 4, 'state': 'open'}, {'id': 3, 'state': 'open'}] and calls == 2
+    assert paged == [{'id': 6, 'state': 'open'}, {'id': 4, 'state': 'open'}]
+
+
+def test_use_cache_returns_every_entry_when_the_cache_overflows():
+    import asyncio
+    from msorm.models import ModelBase
+    odoo = FakeOdoo({'event.registration': registrations(250)})
+    req = odoo.requester()
+    req.cache.max_bytes = 20000
+    model = ModelBase(req, 'event.registration')
+
+    async def run():
+        searched = await model.get_entries('state', filters=[['id', '>=', 1]], use_cache=True)
+        by_ids = await model.get_entries('state', ids=list(range(250, 0, -1)), use_cache=True)
+        await model.field_types()
+        del odoo.calls[:]
+        local = await model.get_entries('state', filters=[['id', '>=', 1], ['state', '=', 'open']], local=True)
+        return searched, by_ids, local
+
+    searched, by_ids, local = asyncio.new_event_loop().run_until_complete(run())
+    assert [e['id'] for e in searched] == list(range(1, 251))
+    assert [e['id'] for e in local] == list(range(2, 251, 2))
+    assert set(method for method, _, _ in odoo.calls) == {'read'}
+    assert [e['id'] for e in by_ids] == list(range(250, 0, -1)) and all('state' in e for e in by_ids)
+    assert req.cache.nbytes <= 20000
+
+def test_persisted_cache_rereads_only_changed_entries(tmp_path):
+    import asyncio
+    from msorm.models import ModelBase
+    records = registrations(5)
+    odoo = FakeOdoo({'event.registration': records})
+
+    async def run(req):
+        try:
+            model = ModelBase(req, 'event.registration')
+            return await model.get_entries('state', ids=[1, 2, 3, 4, 5], use_cache=True)
+        finally:
+            await req.close()
+
+    loop = asyncio.new_event_loop()
+    first = loop.run_until_complete(run(odoo.requester(tmp_path / 'db.sqlite')))
+    records[3].update(state='cancel', write_date='2018-02-01 00:00:00')
+    del odoo.calls[:]
+    second = loop.run_until_complete(run(odoo.requester(tmp_path / 'db.sqlite')))
+    assert [e['state'] for e in first] == ['draft', 'open', 'draft', 'open', 'draft']
+    assert [e['state'] for e in second] == ['draft', 'open', 'cancel', 'open', 'draft']
+    # the versions of the warm-started entries are checked at once, and only the changed one is read again
+    assert [(args[0], kwargs['fields']) for _, args, kwargs in odoo.calls] == \
+        [([1, 2, 3, 4, 5], ['__last_update']), ([3], ['state', '__last_update'])]
+
+def test_sync_engine_pulls_deltas_and_reconciles_deletions():
+    import asyncio
+    from msorm.models import ModelBase
+    from msorm.sync import SyncEngine
+    records = registrations(5)
+    odoo = FakeOdoo({'event.registration': records})
+    engine = SyncEngine(ModelBase(odoo.requester(), 'event.registration'), 'state')
+
+    async def run():
+        first = await engine.sync()
+        records[3].update(state='cancel', write_date='2018-01-06 00:00:00')
+        second = await engine.sync(reconcile=False)
+        del records[4]
+        third = await engine.sync(reconcile=True)
+        return first, second, third, await engine.entries()
+
+    first, second, third, entries = asyncio.new_event_loop().run_until_complete(run())
+    assert first.updated == [1, 2, 3, 4, 5] and first.reconciled
+    # entries written in the second of the watermark are pulled again
+    assert second.updated == [3, 5] and second.deleted == []
+    assert third.updated == [3] and third.deleted == [4]
+    assert [(e['id'], e['state']) for e in entries] == [(1, 'draft'), (2, 'open'), (3, 'cancel'), (5, 'draft')]
+
+
+def test_batcher_falls_back_when_multicall_is_rejected():
+    import asyncio
+    from msorm.models import ModelBase
+    odoo = FakeOdoo({'event.registration': registrations(4)})
+    req = odoo.requester()
+    model = ModelBase(req, 'event.registration')
+
+    async def run():
+        with req.batch():
+            return await asyncio.gather(model.get_entries('state', filters=[['state', '=', 'open']]),
+                                        model.get_entries('state', filters=[['state', '=', 'draft']]))
+
+    opened, drafts = asyncio.new_event_loop().run_until_complete(run())
+    assert [e['id'] for e in opened] == [2, 4] and [e['id'] for e in drafts] == [1, 3]
+    assert not req.batcher.supported and req.batcher.stats.roundtrips == 2
+
+
+def test_batcher_keeps_multicall_on_other_faults_and_remembers_rejection(tmp_path):
+    import asyncio
+    import xmlrpc.client
+    from msorm.batch import Batcher
+    from msorm.cache import DiskStore
+    from msorm.scheduler import Scheduler
+
+    class Server:
+        supports_multicall = True
+
+        def __init__(self, fault):
+            self.fault, self.methods = fault, list()
+
+        async def call(self, service, method, *params):
+            self.methods.append(method)
+            if method == 'system.multicall':
+                raise self.fault
+            return params[0]
+
+    async def run(batcher):
+        with batcher.batch():
+            results = await asyncio.gather(batcher.call('object', 'echo', (1,)), batcher.call('object', 'echo', (2,)),
+                                           return_exceptions=True)
+        return results, batcher.active
+
+    store = DiskStore(tmp_path / 'store.sqlite')
+    expired = Server(xmlrpc.client.Fault(3, 'Access Denied'))
+    batcher = Batcher(expired, Scheduler(4), store=store, domain='odoo.example')
+    results, active = asyncio.new_event_loop().run_until_complete(run(batcher))
+    assert all(isinstance(r, xmlrpc.client.Fault) and r.faultCode == 3 for r in results) and not active
+    assert batcher.supported and store.load_multicall('odoo.example') is None
+
+    stock = Server(xmlrpc.client.Fault(1, 'Method not available system.multicall'))
+    batcher = Batcher(stock, Scheduler(4), store=store, domain='odoo.example')
+    assert asyncio.new_event_loop().run_until_complete(run(batcher))[0] == [1, 2] and not batcher.supported
+
+    # the next run knows the domain rejects multicall and dispatches individually right away
+    restarted = Server(xmlrpc.client.Fault(1, 'Method not available system.multicall'))
+    batcher = Batcher(restarted, Scheduler(4), store=DiskStore(tmp_path / 'store.sqlite'), domain='odoo.example')
+    assert asyncio.new_event_loop().run_until_complete(run(batcher))[0] == [1, 2]
+    assert restarted.methods == ['echo', 'echo']
+    assert Batcher(restarted, Scheduler(4), store=store, domain='other.example').supported
+
+
+def test_batch_scope_covers_only_its_own_tasks():
+    import asyncio
+    from msorm.batch import Batcher
+    from msorm.scheduler import Scheduler
+
+    class Server:
+        supports_multicall = False
+
+    batcher = Batcher(Server(), Scheduler(4))
+
+    async def run():
+        inside, outside = asyncio.Event(), asyncio.Event()
+
+        async def batched():
+            with batcher.batch():
+                inside.set()
+                await outside.wait()
+                return batcher.active
+
+        async def unbatched():
+            await inside.wait()
+            active = batcher.active
+            outside.set()
+            return active
+
+        return await asyncio.gather(batched(), unbatched())
+
+    assert asyncio.new_event_loop().run_until_complete(run()) == [True, False]
+
+
+def test_aggregate_falls_back_only_without_read_group():
+    import asyncio
+    import xmlrpc.client
+    from msorm.models import ModelBase
+
+    class Server(FakeOdoo):
+        fault = None
+
+        async def call(self, service, method, *params, rows=False):
+            if params[4] == 'read_group':
+                raise self.fault
+            return await super().call(service, method, *params, rows=rows)
+
+    odoo = Server({'event.registration': registrations(4)})
+    model = ModelBase(odoo.requester(), 'event.registration')
+    odoo.fault = xmlrpc.client.Fault(1, "AttributeError: type object 'event.registration' has no attribute "
+                                        "'read_group'")
+    groups = asyncio.new_event_loop().run_until_complete(model.aggregate(['state']))
+    assert sorted((g['state'], g['__count']) for g in groups) == [('draft', 2), ('open', 2)]
+
+    odoo.fault = xmlrpc.client.Fault(4, 'AccessError')
+    try:
+        asyncio.new_event_loop().run_until_complete(model.aggregate(['state']))
+        assert False
+    except xmlrpc.client.Fault as exc:
+        assert exc.faultCode == 4
+
+
+def test_local_filters_respect_active_test():
+    import asyncio
+    from msorm.models import ModelBase
+    records = registrations(6)
+    for id, record in records.items():
+        record['active'] = id != 2
+    odoo = FakeOdoo({'event.registration': records})
+    model = ModelBase(odoo.requester(), 'event.registration')
+
+    async def ids(filters, **kwargs):
+        return [e['id'] for e in await model.get_entries('state', filters=filters, **kwargs)]
+
+    async def run():
+        return (await ids([['state', '=', 'open']], use_cache=True),
+                await ids([['state', '=', 'open'], ['active', '=', False]], local=True),
+                await ids([['state', '=', 'open']], local=True, context={'active_test': False}),
+                await ids([['id', 'in', [2, 4]]], local=True))
+
+    assert asyncio.new_event_loop().run_until_complete(run()) == ([4, 6], [2], [2, 4, 6], [4])
+
+def test_requester_closes_inside_and_outside_of_a_loop():
+    import asyncio
+    loop = asyncio.new_event_loop()
+
+    async def open_session(req):
+        return req.pool.session
+
+    outside = FakeOdoo({}).requester()
+    session = loop.run_until_complete(open_session(outside))
+    assert outside.close() is None and session.closed
+
+    async def run():
+        req = FakeOdoo({}).requester()
+        session = await open_session(req)
+        await req.close()
+        return session
+
+    assert loop.run_until_complete(run()).closed
+    loop.close()